@@ -0,0 +1,415 @@
+import argparse
+import importlib.util
+import logging
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from types import SimpleNamespace
+
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+STATUSES = ("ACTIVE", "INACTIVE", "ERROR", "DEPLOYING", "DELETED")
+
+# A minimal valid function spec for manifests built by the benchmarks
+BENCH_FUNCTION = {
+    "type": "production",
+    "inferenceUrl": "/v1/chat/completions",
+    "inferencePort": 80,
+    "healthUri": "/health",
+    "containerImage": "nvcr.io/bench-org/bench-team/bench:v1",
+    "apiBodyFormat": "CUSTOM",
+    "inst_backend": "GFN",
+    "inst_gpu_type": "L40S",
+    "inst_type": "gl40s_1.br25_2xlarge",
+    "inst_min": 1,
+    "inst_max": 1,
+    "auto_clean": False,
+}
+
+
+def load_script(filename):
+    # The repo's scripts are not importable by name, load them from their path
+    module_name = os.path.splitext(filename)[0].replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_launcher():
+    return load_script("launch-nvcf.py")
+
+
+# Runs launch-nvcf.py in a fresh interpreter, then reports which heavy modules it imported
+STARTUP_PROBE = """
+import json, runpy, sys
+sys.argv = {argv!r}
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in ("requests", "urllib3", "jinja2", "yaml") if m in sys.modules)))
+"""
+
+
+def synthetic_org(n_versions, n_functions, seed=0):
+    rng = random.Random(seed)
+    function_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(n_functions)]
+    functions = []
+    for i in range(n_versions):
+        fn_index = i % n_functions
+        functions.append(
+            {
+                "id": function_ids[fn_index],
+                "versionId": str(uuid.UUID(int=rng.getrandbits(128))),
+                "name": f"{rng.choice(('ai-', 'qa-', ''))}bench-fn-{fn_index}",
+                "status": rng.choice(STATUSES),
+            }
+        )
+    return functions
+
+
+def legacy_match(functions_objects, manifest_name, manifest_alias, fn_type):
+    # The pre-index categorize_functions matching, kept here as the baseline
+    fn_key = f"{'qa' if fn_type == 'test-' else ''}{manifest_name}"
+    matching_functions = [
+        f
+        for f in functions_objects
+        if (
+            (
+                f.name == fn_key
+                or f.name == manifest_name
+                or (manifest_alias and f.name == manifest_alias)
+                or (manifest_alias and f.name == f"{'qa' if fn_type == 'test' else 'ai'}-{manifest_alias}")
+            )
+            and (f.status == "ACTIVE" or f.status == "ERROR" or f.status == "INACTIVE")
+        )
+    ]
+    if matching_functions:
+        return max(matching_functions, key=lambda x: x.versionId), matching_functions
+    return None, matching_functions
+
+
+def bench_categorize(args):
+    launcher = load_launcher()
+    org = synthetic_org(args.versions, args.functions)
+    functions_objects = [SimpleNamespace(**f) for f in org]
+    names = [f"bench-fn-{i}" for i in range(min(args.manifests, args.functions))]
+
+    runner = launcher.NVCFRunner(
+        job_name="Bench", env_vars={}, backend="bench", environment="production", debug_mode=True
+    )
+    start = time.perf_counter()
+    runner.inventory.load(org)
+    index_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy = {}
+    for name in names:
+        latest, _ = legacy_match(functions_objects, name, name, "production")
+        legacy[name] = latest.versionId if latest else None
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = {}
+    for name in names:
+        runner.manifest = launcher.Manifest.from_dict(
+            {"name": name, "function_alias": name, "functions": [dict(BENCH_FUNCTION)]}
+        )
+        runner.categorize_functions()
+        updates = runner.function_updates
+        indexed[name] = updates[0].current_version_id if updates else None
+    indexed_time = time.perf_counter() - start
+
+    if legacy != indexed:
+        print("ERROR: indexed categorize disagrees with the legacy matcher")
+        sys.exit(1)
+
+    print(f"org: {args.versions} versions / {args.functions} functions, {len(names)} manifests")
+    print(f"index build:          {index_build * 1000:9.2f} ms")
+    print(f"legacy matching:      {legacy_time * 1000:9.2f} ms")
+    print(f"indexed categorize:   {indexed_time * 1000:9.2f} ms")
+    print(f"speedup:              {legacy_time / indexed_time:9.1f}x")
+
+
+# Image the mock reports as missing, for functions rolled out with --missing-images
+MISSING_IMAGE = "bench-org/bench-team/bench:missing"
+
+
+def write_launch_list(path, n_functions, probe=None, fallback=False, missing_images=0, cutover=None):
+    launch_list = {
+        "fn_image": "nvcr.io/bench-org/bench-team/bench:v1",
+        "functions": [
+            {
+                "fn_name": f"bench-fn-{i}",
+                "containerArgs": "--model-id bench/model",
+                "env": [],
+                "models": [],
+                "inst_backend": "GFN",
+                "inst_gpu_type": "L40S",
+                "inst_type": "gl40s_1.br25_2xlarge",
+                "inst_min": 1,
+                "inst_max": 1,
+                "inst_max_request_concurrency": 1,
+            }
+            for i in range(n_functions)
+        ],
+    }
+    if probe is not None:
+        for function in launch_list["functions"]:
+            function.update(auto_test="yes", probe=probe)
+    if cutover is not None:
+        for function in launch_list["functions"]:
+            function["cutover"] = cutover
+    for function in launch_list["functions"][:missing_images]:
+        function["fn_image"] = f"nvcr.io/{MISSING_IMAGE}"
+    if fallback:
+        # Request a pool the mock does not offer, with the usual one as fallback
+        for function in launch_list["functions"]:
+            fallback_placement = {k: function[k] for k in ("inst_backend", "inst_gpu_type", "inst_type")}
+            function.update(inst_gpu_type="A100", inst_type="ga100_1.br20_2xlarge", placements=[fallback_placement])
+    with open(path, "w") as file:
+        load_script("common.py").dump_yaml(launch_list, file, sort_keys=False)
+
+
+def bench_rollout(args):
+    launcher = load_launcher()
+    mock_nvcf = load_script("mock-nvcf.py")
+
+    mock = mock_nvcf.MockNVCF(
+        latency=args.latency,
+        deploy_duration=(args.deploy_min, args.deploy_max),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        invoke_latency=(args.invoke_min, args.invoke_max),
+        cold_start=args.cold_start,
+        missing_images=[MISSING_IMAGE],
+        seed=args.seed,
+    )
+    # Existing versions of the functions being rolled out, plus unrelated org noise
+    mock.seed_org(args.functions, args.versions, prefix="ai-bench-fn")
+    mock.seed_org(args.org_size, 1, prefix="org-fn")
+    server = mock_nvcf.MockServer(mock).start()
+
+    workdir = tempfile.mkdtemp(prefix="nvcf-bench-")
+    os.makedirs(os.path.join(workdir, "templates"))
+    shutil.copy(os.path.join(HERE, "templates", "launch-template.yml.j2"), os.path.join(workdir, "templates"))
+    probe = None
+    if args.auto_test:
+        probe = {"requests": args.probe_requests, "concurrency": args.probe_concurrency}
+        if args.slo_p95_ms is not None:
+            probe["slo_p95_ms"] = args.slo_p95_ms
+    cutover = None
+    if args.cutover:
+        cutover = {"mode": args.cutover, "ready_timeout": 120, "retire_interval": args.retire_interval}
+    write_launch_list(
+        os.path.join(workdir, "launch-list.yml"), args.functions, probe, args.fallback, args.missing_images, cutover
+    )
+
+    os.environ.update(
+        {
+            "NVCF_API_BASE": server.url,
+            "PRD_NVCF_API_KEY": "bench-key",
+            "FN_NGC_ORG": "bench-org",
+            "FN_NGC_TEAM": "bench-team",
+            "FN_HUGGING_FACE_HUB_TOKEN": "hf_bench",
+        }
+    )
+    argv = [
+        "launch-nvcf.py",
+        "--manifest", "templates/launch-template.yml.j2",
+        "--environment", "production",
+        "--function-name", "*",
+        "--max-parallel", str(args.max_parallel),
+    ] + args.launcher_args
+
+    cwd = os.getcwd()
+    saved_argv = sys.argv
+    exit_code = 0
+    os.chdir(workdir)
+    sys.argv = argv
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        launcher.main()
+    except SystemExit as e:
+        exit_code = e.code or 0
+    finally:
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        sys.argv = saved_argv
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"rollout: {args.functions} functions x {args.versions} versions, org noise {args.org_size},"
+        f" max-parallel {args.max_parallel}"
+    )
+    print(f"exit code:            {exit_code:>9}")
+    print(f"wall time:            {wall:9.2f} s")
+    print(f"peak traced memory:   {peak / 1024 / 1024:9.2f} MiB")
+    print(f"requests:             {mock.requests['total']:>9}")
+    for name, count in sorted(mock.requests.items()):
+        if name != "total":
+            print(f"  {name:<20}{count:>9}")
+
+
+def time_runs(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+
+def bench_startup(args):
+    workdir = tempfile.mkdtemp(prefix="nvcf-bench-")
+    try:
+        os.makedirs(os.path.join(workdir, "templates"))
+        shutil.copy(os.path.join(HERE, "templates", "launch-template.yml.j2"), os.path.join(workdir, "templates"))
+        write_launch_list(os.path.join(workdir, "launch-list.yml"), args.functions)
+        env = dict(
+            os.environ,
+            PYTHONPATH=HERE,
+            PRD_NVCF_API_KEY="bench-key",
+            FN_NGC_ORG="bench-org",
+            FN_NGC_TEAM="bench-team",
+            FN_HUGGING_FACE_HUB_TOKEN="hf_bench",
+        )
+        argv = [
+            "launch-nvcf.py",
+            "--manifest", "templates/launch-template.yml.j2",
+            "--environment", "production",
+            "--function-name", "*",
+            "--journal", "",
+            "--debug",
+        ]
+        code = STARTUP_PROBE.format(argv=argv, script=os.path.join(HERE, "launch-nvcf.py"))
+
+        def run(command):
+            result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+            return result.stdout
+
+        base_min, base_median, _ = time_runs(lambda: run([sys.executable, "-c", "pass"]), args.runs)
+        import_min, import_median, _ = time_runs(lambda: run([sys.executable, "-c", "import common"]), args.runs)
+        debug_min, debug_median, stdout = time_runs(lambda: run([sys.executable, "-c", code]), args.runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"startup: {args.runs} runs, {args.functions}-entry launch list (min / median)")
+    print(f"interpreter:          {base_min * 1000:9.1f} / {base_median * 1000:.1f} ms")
+    print(f"import common:        {import_min * 1000:9.1f} / {import_median * 1000:.1f} ms")
+    print(f"--debug render:       {debug_min * 1000:9.1f} / {debug_median * 1000:.1f} ms")
+    print(f"modules imported:     {stdout.strip().splitlines()[-1]}")
+
+
+def bench_yaml(args):
+    common = load_script("common.py")
+    with tempfile.NamedTemporaryFile("w+", suffix=".yml") as file:
+        write_launch_list(file.name, args.functions)
+        text = file.read()
+    data = yaml.safe_load(text)
+
+    print(f"yaml: {args.functions}-entry launch list, {len(text) / 1024:.1f} KiB, {args.runs} runs (median)")
+    print(f"libyaml available:    {yaml.__with_libyaml__!s:>9}")
+    loaders = [("SafeLoader", yaml.SafeLoader, yaml.SafeDumper)]
+    if yaml.__with_libyaml__:
+        loaders.append(("CSafeLoader", yaml.CSafeLoader, yaml.CSafeDumper))
+    baseline = None
+    for name, loader, dumper in loaders:
+        _, load_time, loaded = time_runs(lambda: yaml.load(text, Loader=loader), args.runs)
+        _, dump_time, _ = time_runs(lambda: yaml.dump(data, Dumper=dumper, sort_keys=False), args.runs)
+        if loaded != data:
+            print(f"ERROR: {name} parses the launch list differently")
+            sys.exit(1)
+        baseline = baseline or load_time
+        print(
+            f"{name + ' load:':<22}{load_time * 1000:9.2f} ms  {args.functions / load_time:10.0f} entries/s"
+            f"  {baseline / load_time:5.1f}x"
+        )
+        print(f"{name.replace('Loader', 'Dumper') + ' dump:':<22}{dump_time * 1000:9.2f} ms")
+    print(f"used by load_yaml:    {common.YAMLLoader.__name__:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the NVCF launcher")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    categorize = subparsers.add_parser("categorize", help="Legacy vs indexed categorize_functions matching")
+    categorize.add_argument("--versions", type=int, default=10000, help="Function versions in the synthetic org")
+    categorize.add_argument("--functions", type=int, default=2000, help="Distinct functions in the synthetic org")
+    categorize.add_argument("--manifests", type=int, default=200, help="Manifests to categorize")
+    categorize.set_defaults(func=bench_categorize)
+
+    rollout = subparsers.add_parser("rollout", help="Drive launch-nvcf.py main() against mock-nvcf.py")
+    rollout.add_argument("--functions", type=int, default=10, help="Functions in the launch list")
+    rollout.add_argument("--versions", type=int, default=3, help="Existing versions per function")
+    rollout.add_argument("--org-size", type=int, default=1000, help="Unrelated functions in the org")
+    rollout.add_argument("--max-parallel", type=int, default=10, help="Passed to launch-nvcf.py")
+    rollout.add_argument("--latency", type=float, default=0.01, help="Mock API latency in seconds")
+    rollout.add_argument("--deploy-min", type=float, default=5.0, help="Shortest mock deployment in seconds")
+    rollout.add_argument("--deploy-max", type=float, default=15.0, help="Longest mock deployment in seconds")
+    rollout.add_argument("--error-rate", type=float, default=0.0, help="Fraction of deployments ending in ERROR")
+    rollout.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    rollout.add_argument("--invoke-min", type=float, default=0.05, help="Shortest mock invocation in seconds")
+    rollout.add_argument("--invoke-max", type=float, default=0.2, help="Longest mock invocation in seconds")
+    rollout.add_argument("--auto-test", action="store_true", help="Turn on the post-deploy load probe")
+    rollout.add_argument("--probe-requests", type=int, default=50, help="Probe requests per function")
+    rollout.add_argument("--probe-concurrency", type=int, default=4, help="Concurrent probe requests")
+    rollout.add_argument("--slo-p95-ms", type=float, default=None, help="p95 latency SLO for the probe")
+    rollout.add_argument(
+        "--fallback", action="store_true", help="Request an unavailable GPU pool with a fallback placement"
+    )
+    rollout.add_argument(
+        "--cold-start", type=float, default=0.0, help="Seconds a new mock version answers 503 after ACTIVE"
+    )
+    rollout.add_argument(
+        "--cutover", choices=("immediate", "warm", "gradual"), default=None, help="Cutover mode for the updates"
+    )
+    rollout.add_argument(
+        "--retire-interval", type=float, default=2.0, help="Seconds between retirements with --cutover gradual"
+    )
+    rollout.add_argument(
+        "--missing-images", type=int, default=0, help="Functions whose image tag the mock registry does not have"
+    )
+    rollout.add_argument("--seed", type=int, default=0)
+    rollout.add_argument("--verbose", action="store_true", help="Show the launcher's log output")
+    rollout.add_argument("launcher_args", nargs=argparse.REMAINDER, help="Extra launch-nvcf.py arguments after --")
+    rollout.set_defaults(func=bench_rollout)
+
+    startup = subparsers.add_parser("startup", help="Cold start of launch-nvcf.py --debug in a fresh interpreter")
+    startup.add_argument("--functions", type=int, default=500, help="Functions in the launch list")
+    startup.add_argument("--runs", type=int, default=5, help="Runs to take the min and median of")
+    startup.set_defaults(func=bench_startup)
+
+    yaml_parser = subparsers.add_parser("yaml", help="Launch list parse and dump throughput per YAML loader")
+    yaml_parser.add_argument("--functions", type=int, default=500, help="Functions in the launch list")
+    yaml_parser.add_argument("--runs", type=int, default=10, help="Runs to take the median of")
+    yaml_parser.set_defaults(func=bench_yaml)
+
+    args = parser.parse_args()
+    if getattr(args, "launcher_args", None) and args.launcher_args[0] == "--":
+        args.launcher_args = args.launcher_args[1:]
+    # Keep the launcher's per-manifest logging out of the measurements
+    if not getattr(args, "verbose", False):
+        logging.getLogger("nvcf").setLevel(logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
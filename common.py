@@ -1,12 +1,1550 @@
 # common.py
 import os
+import re
+import sys
 import base64
-import requests
+import codecs
+import hashlib
+import heapq
+import importlib
+import itertools
+import json
+import logging
+import random
+import threading
+import time
 import yaml
-from requests.exceptions import HTTPError, ConnectionError
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from datetime import timedelta
+from heapq import merge
+from operator import itemgetter
+from email.utils import parsedate_to_datetime
 from types import SimpleNamespace
+from urllib.parse import urlsplit
 import traceback
 
+logger = logging.getLogger("nvcf")
+
+# Slotted dataclasses and bisect/insort with key= need Python 3.10
+if sys.version_info < (3, 10):
+    raise ImportError(f"the NVCF launcher needs Python 3.10 or newer, this is {sys.version.split()[0]}")
+
+# PyYAML's libyaml bindings parse several times faster, when it was built with them
+try:
+    from yaml import CSafeDumper as YAMLDumper, CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeDumper as YAMLDumper, SafeLoader as YAMLLoader
+
+# Function versions are tagged with the hash of the payloads they were created from
+FINGERPRINT_TAG_PREFIX = "spec-sha256-"
+
+# Name of the function the current thread is working on, used to tag log records
+log_context = threading.local()
+
+
+class _LazyModule:
+    # Stands in for a module and imports it on first attribute access, so runs
+    # that never reach it (e.g. --debug rendering and requests) skip the import
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    return _LazyModule(name)
+
+
+def load_yaml(stream):
+    return yaml.load(stream, Loader=YAMLLoader)
+
+
+def dump_yaml(data, stream=None, **kwargs):
+    return yaml.dump(data, stream, Dumper=YAMLDumper, **kwargs)
+
+
+requests = lazy_import("requests")
+
+
+def iter_json_array(chunks, key):
+    # Incrementally yields the items of the top-level array `key` from a JSON
+    # document delivered as byte chunks, without holding the whole document.
+    # Items must be objects or arrays: a number split across chunks would be
+    # decoded early
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer += utf8.decode(b"", final=True)
+        else:
+            buffer += utf8.decode(chunk)
+
+    match = None
+    while match is None:
+        match = start.search(buffer)
+        if match is None:
+            if exhausted:
+                return
+            # Keep enough of the tail to match a key split across chunks
+            buffer = buffer[-(len(key) + 16):]
+            read_more()
+    pos = match.end()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer):
+            if exhausted:
+                raise ValueError(f"Unterminated '{key}' array in response")
+            buffer, pos = buffer[pos:], 0
+            read_more()
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Most likely an item split across chunks
+            if exhausted:
+                raise
+            buffer, pos = buffer[pos:], 0
+            read_more()
+            continue
+        yield item
+        pos = end
+
+
+def spec_fingerprint(*payloads):
+    # Canonical JSON (sorted keys, no whitespace) so equal specs hash equally
+    canonical = json.dumps(payloads, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class FunctionContextFilter(logging.Filter):
+    # Suffix the logger name with the function being deployed so interleaved
+    # output from parallel workers can be told apart (nvcf.<function>)
+    def filter(self, record):
+        fn_name = getattr(log_context, "name", None)
+        if fn_name:
+            record.name = f"{record.name}.{fn_name}"
+        return True
+
+
+logger.addFilter(FunctionContextFilter())
+
+
+def _escape_label(value):
+    # Prometheus text format label value: backslash, double quote and newline
+    # are the characters that must be escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SpanRecorder:
+    # Timed spans for each rollout phase (render, list, register, poll, ...),
+    # tagged with the function and version being worked on. Summarized at the
+    # end of a run and exportable as JSON or a Prometheus textfile. Totals are
+    # kept as spans are recorded, so a long-running daemon can bound the raw
+    # spans it keeps (keep) without losing them from the metrics
+    def __init__(self, keep=None):
+        self.started = time.time()
+        self.spans = deque(maxlen=keep)
+        self._phases = {}
+        self._per_function = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, start, duration, **attrs):
+        span = {
+            "phase": phase,
+            "start": round(start, 6),
+            "duration": round(duration, 6),
+            "function": getattr(log_context, "name", None),
+            "version_id": getattr(log_context, "version_id", None),
+        }
+        span.update({k: v for k, v in attrs.items() if v is not None})
+        with self._lock:
+            self.spans.append(span)
+            stats = self._phases.setdefault(phase, {"count": 0, "total": 0.0, "max": 0.0, "errors": 0, "retries": 0})
+            stats["count"] += 1
+            stats["total"] += span["duration"]
+            stats["max"] = max(stats["max"], span["duration"])
+            stats["errors"] += 1 if "error" in span else 0
+            stats["retries"] += span.get("retries", 0)
+            if span["function"]:
+                key = (span["function"], phase)
+                self._per_function[key] = self._per_function.get(key, 0.0) + span["duration"]
+        return span
+
+    def keep_last(self, keep):
+        # Only the last keep raw spans are kept from now on
+        with self._lock:
+            self.spans = deque(self.spans, maxlen=keep)
+
+    @contextmanager
+    def span(self, phase, **attrs):
+        # Yields the attribute dict so callers can add e.g. the HTTP status
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as err:
+            attrs.setdefault("error", f"{type(err).__name__}: {err}"[:200])
+            raise
+        finally:
+            self.record(phase, start, time.perf_counter() - t0, **attrs)
+
+    def summary(self):
+        with self._lock:
+            phases = {phase: dict(stats) for phase, stats in self._phases.items()}
+        for stats in phases.values():
+            stats["mean"] = stats["total"] / stats["count"]
+        return phases
+
+    def report(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "started": self.started,
+            "duration": time.time() - self.started,
+            "phases": self.summary(),
+            "spans": spans,
+        }
+
+    def log_summary(self, logger):
+        phases = self.summary()
+        if not phases:
+            return
+        lines = [f"{'phase':<14}{'count':>7}{'total s':>11}{'mean s':>10}{'max s':>10}{'retries':>9}{'errors':>8}"]
+        for phase, stats in sorted(phases.items(), key=lambda item: -item[1]["total"]):
+            lines.append(
+                f"{phase:<14}{stats['count']:>7}{stats['total']:>11.2f}{stats['mean']:>10.2f}"
+                f"{stats['max']:>10.2f}{stats['retries']:>9}{stats['errors']:>8}"
+            )
+        logger.info(f"Rollout timing ({time.time() - self.started:.1f}s wall):\n" + "\n".join(lines))
+
+    def write_json(self, path):
+        self._write(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path):
+        self._write(path, self.prometheus_text())
+
+    def prometheus_text(self):
+        def labels(**values):
+            return ",".join(f'{k}="{_escape_label(v)}"' for k, v in values.items())
+
+        lines = [
+            "# HELP nvcf_launcher_run_seconds Wall time of the launcher run.",
+            "# TYPE nvcf_launcher_run_seconds gauge",
+            f"nvcf_launcher_run_seconds {time.time() - self.started:.6f}",
+        ]
+        metrics = (
+            ("phase_seconds_total", "total", "counter", "Time spent in each rollout phase."),
+            ("phase_seconds_max", "max", "gauge", "Longest single span of each rollout phase."),
+            ("phase_spans_total", "count", "counter", "Number of spans recorded for each rollout phase."),
+            ("phase_retries_total", "retries", "counter", "HTTP retries made during each rollout phase."),
+            ("phase_errors_total", "errors", "counter", "Failed spans for each rollout phase."),
+        )
+        phases = self.summary()
+        for name, key, metric_type, help_text in metrics:
+            lines.append(f"# HELP nvcf_launcher_{name} {help_text}")
+            lines.append(f"# TYPE nvcf_launcher_{name} {metric_type}")
+            for phase, stats in sorted(phases.items()):
+                lines.append(f"nvcf_launcher_{name}{{{labels(phase=phase)}}} {round(stats[key], 6)}")
+
+        with self._lock:
+            per_function = dict(self._per_function)
+        lines.append("# HELP nvcf_launcher_function_phase_seconds Time spent per function and phase.")
+        lines.append("# TYPE nvcf_launcher_function_phase_seconds gauge")
+        for (function, phase), total in sorted(per_function.items()):
+            lines.append(f"nvcf_launcher_function_phase_seconds{{{labels(function=function, phase=phase)}}} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write(path, content):
+        # Write then rename, so collectors never read a partial file
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+
+class NVCFClient:
+    # Shared HTTP client for the NGC/NVCF APIs: one keep-alive session per host,
+    # retries with exponential backoff and jitter, and a single 401 handler
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+    def __init__(
+        self,
+        token_provider,
+        on_unauthorized=None,
+        timeout=(10, 30),
+        max_retries=5,
+        backoff=1.0,
+        max_backoff=60.0,
+        pool_size=10,
+        spans=None,
+    ):
+        self.token_provider = token_provider
+        self.spans = spans
+        self.on_unauthorized = on_unauthorized
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._pool_sizes = {}
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def _session(self, url):
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = requests.Session()
+                self._mount(host, self.pool_size + self._reserved.get(host, 0))
+            return session
+
+    def _mount(self, host, size):
+        # Retries are handled in request() so they can honor Retry-After
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0)
+        self._sessions[host].mount(f"{urlsplit(host).scheme}://", adapter)
+        self._pool_sizes[host] = size
+
+    @contextmanager
+    def reserve(self, url, connections):
+        # Grows url's connection pool by connections while in use, e.g. for a
+        # load probe's workers, so they do not open and discard connections.
+        # The pool is only ever grown; a larger one costs nothing while idle
+        host = "{0.scheme}://{0.netloc}".format(urlsplit(url))
+        with self._lock:
+            self._reserved[host] = self._reserved.get(host, 0) + connections
+            size = self.pool_size + self._reserved[host]
+            if host in self._sessions and size > self._pool_sizes[host]:
+                self._mount(host, size)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reserved[host] -= connections
+
+    def _headers(self):
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.token_provider()}"}
+
+    def _backoff_delay(self, attempt):
+        # Full jitter: random delay up to the exponential cap
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return min(self.max_backoff, max(0.0, float(value)))
+        except ValueError:
+            pass
+        try:
+            return min(self.max_backoff, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return None
+
+    def request(
+        self, method, url, json=None, idempotent=None, timeout=None, phase=None, headers=None, reauth=True, **kwargs
+    ):
+        # phase names the span this request is recorded under (register, poll, ...);
+        # headers are merged over the defaults, a None value drops a default header.
+        # reauth=False returns a 401 as is, for APIs outside NVCF (e.g. a registry
+        # token challenge) where reloading the NVCF key would not help
+        if self.spans is None:
+            return self._request(method, url, json, idempotent, timeout, headers, reauth, **kwargs)
+        with self.spans.span(phase or "http", method=method.upper()) as attrs:
+            response = self._request(method, url, json, idempotent, timeout, headers, reauth, **kwargs)
+            attrs["status"] = response.status_code
+            attrs["retries"] = response.retries
+            return response
+
+    def _request(self, method, url, json, idempotent, timeout, headers=None, reauth=True, **kwargs):
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in self.IDEMPOTENT_METHODS
+        session = self._session(url)
+        attempt = 0
+        reauthenticated = False
+
+        while True:
+            try:
+                response = session.request(
+                    method,
+                    url,
+                    headers={**self._headers(), **(headers or {})},
+                    json=json,
+                    timeout=timeout or self.timeout,
+                    **kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout) as err:
+                # A connect timeout never reached the server, anything else is
+                # only safe to resend for idempotent calls
+                retryable = idempotent or isinstance(err, requests.ConnectTimeout)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"{method} {url} failed ({err!r}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code == 401 and reauth and not reauthenticated and self.on_unauthorized:
+                logger.info(f"401 encountered on {method} {url} - re-authenticating")
+                self.on_unauthorized()
+                reauthenticated = True
+                continue
+
+            # Throttled requests were not processed, so they are safe to resend
+            retryable = idempotent or response.status_code == 429
+            if response.status_code in self.RETRY_STATUSES and retryable and attempt < self.max_retries:
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.retries = attempt
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, json=None, **kwargs):
+        return self.request("POST", url, json=json, **kwargs)
+
+    def delete(self, url, json=None, **kwargs):
+        return self.request("DELETE", url, json=json, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+class DeploymentFailed(Exception):
+    pass
+
+
+class ProbeFailed(Exception):
+    pass
+
+
+class DeploymentWatch:
+    def __init__(self, url, name, timeout, expected, on_success, on_failure, on_timeout, on_poll):
+        self.url = url
+        self.name = name
+        self.expected = expected
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.on_timeout = on_timeout
+        self.on_poll = on_poll
+        self.future = Future()
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.interval = None
+        self.status = None
+        self.polls = 0
+        self.errors = 0
+
+
+class DeploymentPoller:
+    # Schedules status polls for many deployments from a single thread, and
+    # runs the HTTP calls on a small worker pool so a throttled or slow
+    # deployment does not hold up the others. Checks are frequent right after
+    # a deploy, back off while the function sits in PENDING/DEPLOYING, and
+    # tighten again around the expected finish before backing off once more
+    SUCCESS_STATUSES = ("ACTIVE",)
+    FAILURE_STATUSES = ("ERROR",)
+
+    def __init__(
+        self,
+        client,
+        fast_interval=5.0,
+        slow_interval=60.0,
+        backoff=1.5,
+        fast_window=60.0,
+        max_errors=3,
+        workers=4,
+    ):
+        self.client = client
+        self.workers = workers
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.backoff = backoff
+        self.fast_window = fast_window
+        self.max_errors = max_errors
+        self.requests = 0
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._closed = False
+
+    def watch(
+        self,
+        url,
+        name=None,
+        timeout=3600,
+        expected=None,
+        on_success=None,
+        on_failure=None,
+        on_timeout=None,
+        on_poll=None,
+    ):
+        # Returns a Future resolved with the final status payload, or failed
+        # with DeploymentFailed / TimeoutError. on_poll is called for every
+        # request sent for this deployment, e.g. to count them per rollout
+        watch = DeploymentWatch(url, name, timeout, expected, on_success, on_failure, on_timeout, on_poll)
+        with self._cond:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="nvcf-poll")
+                self._thread = threading.Thread(target=self._run, name="nvcf-poller", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._queue, (time.monotonic() + self.fast_interval, next(self._counter), watch))
+            self._cond.notify()
+        return watch.future
+
+    def next_interval(self, watch, now):
+        elapsed = now - watch.started
+        if elapsed < self.fast_window:
+            interval = self.fast_interval
+        else:
+            interval = min(self.slow_interval, (watch.interval or self.fast_interval) * self.backoff)
+        if watch.expected:
+            # Don't sleep past the point where the deployment usually finishes,
+            # and check often around it. Once it is well overdue, back off again
+            approach = watch.expected * 0.8 - elapsed
+            if approach > 0:
+                interval = min(interval, max(self.fast_interval, approach))
+            elif elapsed < watch.expected * 1.2:
+                interval = self.fast_interval
+        watch.interval = interval
+        return min(interval, max(0.0, watch.deadline - now))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._cond.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if self._closed:
+                    return
+                _, _, watch = heapq.heappop(self._queue)
+            # A watch is only back on the heap once its check is done, so it
+            # is never polled twice at the same time
+            self._executor.submit(self._poll, watch)
+
+    def _poll(self, watch):
+        log_context.name = watch.name
+        log_context.version_id = watch.url.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            again = self._check(watch)
+        except Exception as exc:
+            self._finish(watch, watch.on_failure, exc=exc)
+            again = False
+        finally:
+            log_context.name = None
+            log_context.version_id = None
+        if again:
+            now = time.monotonic()
+            with self._cond:
+                if not self._closed:
+                    heapq.heappush(self._queue, (now + self.next_interval(watch, now), next(self._counter), watch))
+                    self._cond.notify()
+                    return
+            watch.future.cancel()
+
+    def _check(self, watch):
+        # Returns True when the deployment should be polled again
+        if time.monotonic() >= watch.deadline:
+            elapsed = int(time.monotonic() - watch.started)
+            self._finish(watch, watch.on_timeout, exc=TimeoutError(
+                f"Deployment did not become ACTIVE within {elapsed} seconds (last status: {watch.status})"
+            ))
+            return False
+
+        try:
+            self._count(watch)
+            watch.polls += 1
+            response = self.client.get(watch.url, phase="poll")
+            response.raise_for_status()
+            data = response.json()
+        except requests.HTTPError as http_err:
+            # Retryable statuses were already retried by the client
+            self._finish(watch, watch.on_failure, exc=DeploymentFailed(f"HTTP error occurred: {http_err}"))
+            return False
+        except (requests.RequestException, ValueError) as err:
+            watch.errors += 1
+            logger.warning(f"Deployment status check failed ({watch.errors}/{self.max_errors}): {err}")
+            if watch.errors >= self.max_errors:
+                self._finish(watch, watch.on_failure, exc=DeploymentFailed(f"Error while polling deployment: {err}"))
+                return False
+            return True
+
+        watch.errors = 0
+        status = data.get("deployment", {}).get("functionStatus", "")
+        if status != watch.status:
+            logger.info(f"Deployment status: {status or 'UNKNOWN'}")
+            watch.status = status
+
+        elapsed = time.monotonic() - watch.started
+        if status in self.SUCCESS_STATUSES:
+            logger.info(f"NVCF function met deploy success condition in {elapsed:.2f} seconds ({watch.polls} polls).")
+            self._finish(watch, watch.on_success, result=data)
+            return False
+        if status in self.FAILURE_STATUSES:
+            self._finish(watch, watch.on_failure, exc=DeploymentFailed(
+                f"Deployment entered {status} after {elapsed:.2f} seconds"
+            ))
+            return False
+        return True
+
+    def _count(self, watch):
+        with self._cond:
+            self.requests += 1
+        if watch.on_poll is not None:
+            watch.on_poll()
+
+    def _finish(self, watch, callback, result=None, exc=None):
+        if callback is not None:
+            try:
+                callback(watch, result if exc is None else exc)
+            except Exception:
+                logger.error(traceback.format_exc())
+        if exc is None:
+            watch.future.set_result(result)
+        else:
+            watch.future.set_exception(exc)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            pending = [watch for _, _, watch in self._queue]
+            self._queue = []
+            self._cond.notify()
+        for watch in pending:
+            watch.future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_duration(value):
+    # "90s", "30m", "12h", "7d" or plain seconds
+    units = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+    text = str(value).strip()
+    number, unit = (text[:-1], text[-1]) if text and text[-1] in units else (text, "s")
+    try:
+        return timedelta(**{units[unit]: float(number)})
+    except (ValueError, OverflowError):
+        raise ValueError(f"expected a duration like 90s, 30m, 12h or 7d, got {value!r}") from None
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+@dataclass(slots=True)
+class ProbeResult:
+    requests: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    latencies: list = field(default_factory=list)
+    queue_depths: list = field(default_factory=list)
+    error_samples: list = field(default_factory=list)
+
+    def latency_ms(self, pct):
+        value = percentile(self.latencies, pct)
+        return None if value is None else value * 1000
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+    @property
+    def throughput(self):
+        return (self.requests - self.errors) / self.duration if self.duration else 0.0
+
+    @property
+    def max_queue_depth(self):
+        return max(self.queue_depths, default=0)
+
+    def summary(self):
+        latencies = ", ".join(
+            f"p{pct} {self.latency_ms(pct):.0f}ms" for pct in (50, 95, 99) if self.latencies
+        )
+        return (
+            f"{self.requests} requests in {self.duration:.1f}s, {self.throughput:.2f} req/s,"
+            f" {self.error_rate:.1%} errors, {latencies or 'no successful responses'},"
+            f" max queue depth {self.max_queue_depth}"
+        )
+
+    def violations(self, spec):
+        # SLOs from a ProbeSpec that this result misses
+        missed = []
+        if not self.latencies:
+            missed.append("no successful responses")
+        for pct in (50, 95, 99):
+            limit = getattr(spec, f"slo_p{pct}_ms")
+            if limit is not None and self.latencies and self.latency_ms(pct) > limit:
+                missed.append(f"p{pct} {self.latency_ms(pct):.0f}ms > {limit:g}ms")
+        if spec.slo_error_rate is not None and self.error_rate > spec.slo_error_rate:
+            missed.append(f"error rate {self.error_rate:.1%} > {spec.slo_error_rate:.1%}")
+        if spec.slo_min_rps is not None and self.throughput < spec.slo_min_rps:
+            missed.append(f"throughput {self.throughput:.2f} req/s < {spec.slo_min_rps:g} req/s")
+        if spec.slo_max_queue_depth is not None and self.max_queue_depth > spec.slo_max_queue_depth:
+            missed.append(f"queue depth {self.max_queue_depth} > {spec.slo_max_queue_depth}")
+        return missed
+
+
+class LoadProbe:
+    # Sends a fixed number of requests at one function version through the
+    # pexec invoke API, concurrency at a time, and samples the version's
+    # queue depth through queue_details while the load runs
+    def __init__(self, client, invoke_base, queue_base, function_id, version_id, queue_interval=1.0):
+        self.client = client
+        self.invoke_url = f"{invoke_base}/pexec/functions/{function_id}/versions/{version_id}"
+        self.status_base = f"{invoke_base}/pexec/status"
+        self.queue_url = f"{queue_base}/queues/functions/{function_id}/versions/{version_id}"
+        self.version_id = version_id
+        self.queue_interval = queue_interval
+
+    def run(self, spec, payload):
+        result = ProbeResult()
+        done = threading.Event()
+        sampler = threading.Thread(target=self._sample_queue, args=(result, done), name="nvcf-probe-queue", daemon=True)
+        context = (getattr(log_context, "name", None), getattr(log_context, "version_id", None))
+
+        def invoke(_):
+            log_context.name, log_context.version_id = context
+            return self.invoke(payload, spec.timeout)
+
+        start = time.perf_counter()
+        # Room in the connection pools for the probe's workers and queue sampler
+        with self.client.reserve(self.invoke_url, spec.concurrency), self.client.reserve(self.queue_url, 1):
+            sampler.start()
+            try:
+                with ThreadPoolExecutor(max_workers=spec.concurrency, thread_name_prefix="nvcf-probe") as executor:
+                    for latency, error in executor.map(invoke, range(spec.requests)):
+                        result.requests += 1
+                        if error is None:
+                            result.latencies.append(latency)
+                        else:
+                            result.errors += 1
+                            if len(result.error_samples) < 5:
+                                result.error_samples.append(error)
+            finally:
+                result.duration = time.perf_counter() - start
+                done.set()
+                sampler.join()
+        result.latencies.sort()
+        return result
+
+    def invoke(self, payload, timeout=60.0):
+        # Returns (latency, error); a 202 is followed through pexec/status until it completes
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        try:
+            response = self.client.post(self.invoke_url, json=payload, timeout=(10, timeout), phase="invoke")
+            while response.status_code == 202:
+                request_id = response.headers.get("NVCF-REQID")
+                if not request_id or time.monotonic() > deadline:
+                    return None, "timed out waiting for the invocation result"
+                response = self.client.get(f"{self.status_base}/{request_id}", timeout=(10, timeout), phase="invoke")
+            if response.status_code >= 400:
+                return None, f"HTTP {response.status_code}"
+            return time.perf_counter() - start, None
+        except requests.RequestException as err:
+            return None, f"{type(err).__name__}: {err}"
+
+    def queue_depth(self):
+        # Requests waiting for this version, or None if queue_details is unavailable
+        try:
+            response = self.client.get(self.queue_url, phase="queue_details")
+            if not response.ok:
+                return None
+            queues = response.json().get("queues") or []
+        except (requests.RequestException, ValueError) as err:
+            logger.debug(f"Queue details unavailable: {err}")
+            return None
+        return sum(q.get("queueDepth") or 0 for q in queues if q.get("functionVersionId") in (None, self.version_id))
+
+    def wait_ready(self, payload, timeout, request_timeout=60.0, interval=5.0):
+        # Invokes the version until a request succeeds. Returns the seconds
+        # waited and None, or the last error once timeout has passed
+        start = time.monotonic()
+        while True:
+            _, error = self.invoke(payload, request_timeout)
+            waited = time.monotonic() - start
+            if error is None or waited + interval > timeout:
+                return waited, error
+            time.sleep(interval)
+
+    def wait_queue(self, limit, timeout):
+        # Waits for the queue depth to drop to limit; returns the last depth
+        # seen, None if queue_details is unavailable
+        deadline = time.monotonic() + timeout
+        while True:
+            depth = self.queue_depth()
+            if depth is None or depth <= limit or time.monotonic() >= deadline:
+                return depth
+            time.sleep(self.queue_interval)
+
+    def _sample_queue(self, result, done):
+        while True:
+            depth = self.queue_depth()
+            if depth is not None:
+                result.queue_depths.append(depth)
+            if done.wait(self.queue_interval):
+                return
+
+
+class _JsonLinesLog:
+    # Append-only JSON lines file of entries keyed by "function". Subclasses
+    # keep the replayed entries (_add) and list the ones still needed
+    # (_live); the file is rewritten with just those once it holds more than
+    # COMPACT_RATIO lines per entry
+    COMPACT_RATIO = 4
+    FSYNC = False
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._live())
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path) as file:
+            for line in file:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+                if isinstance(entry, dict) and entry.get("function"):
+                    self._add(entry)
+        if lines > self.COMPACT_RATIO * max(len(self), 1):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            for entry in self._live():
+                file.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _append(self, entry):
+        # Called with the lock held
+        self._add(entry)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+            if self.FSYNC:
+                file.flush()
+                os.fsync(file.fileno())
+
+
+class DeploymentJournal(_JsonLinesLog):
+    # Append-only JSON lines log of each function's deployment steps
+    # (registered -> deploying -> active/failed), keyed by the registered
+    # function name. A run that was cancelled mid-rollout reads it back to
+    # reattach to its in-flight versions instead of registering new ones
+    FSYNC = True
+
+    def __init__(self, path):
+        self.entries = {}
+        super().__init__(path)
+
+    def _add(self, entry):
+        self.entries[entry["function"]] = entry
+
+    def _live(self):
+        return list(self.entries.values())
+
+    def get(self, name):
+        with self._lock:
+            entry = self.entries.get(name)
+            return dict(entry) if entry else None
+
+    def record(self, name, step, **fields):
+        # "registered" starts a new attempt, later steps add to it
+        with self._lock:
+            now = time.time()
+            entry = {"registered_at": now} if step == "registered" else dict(self.entries.get(name) or {})
+            entry.update(fields)
+            entry.update(function=name, step=step, time=now)
+            self._append(entry)
+        return entry
+
+
+@dataclass(slots=True)
+class DeployEstimate:
+    p50: float
+    p99: float
+    samples: int
+    # "function" or "inst_type": whose history the estimate comes from
+    basis: str
+
+
+class DeploymentHistory(_JsonLinesLog):
+    # Append-only JSON lines record of how long each deployment took to become
+    # ACTIVE (or that it ended in ERROR or timed out), with the function name
+    # and instance type. Only the last KEEP deployments of each function are
+    # kept. Estimates use the function's own deploys that became ACTIVE or
+    # timed out, or those of its instance type when it has fewer than MIN_SAMPLES
+    KEEP = 50
+    MIN_SAMPLES = 3
+    # A timed out deploy took at least its deadline and is counted at that, so
+    # a deadline that was too short grows on the next run instead of repeating
+    SAMPLE_OUTCOMES = ("ACTIVE", "TIMEOUT")
+
+    def __init__(self, path):
+        self._entries = {}
+        super().__init__(path)
+
+    def _add(self, entry):
+        entries = self._entries.get(entry["function"])
+        if entries is None:
+            entries = self._entries[entry["function"]] = deque(maxlen=self.KEEP)
+        entries.append(entry)
+
+    def _live(self):
+        return sorted(itertools.chain.from_iterable(self._entries.values()), key=lambda e: e.get("time", 0))
+
+    def record(self, function, inst_type, outcome, duration, **fields):
+        entry = {
+            "function": function,
+            "inst_type": inst_type,
+            "outcome": outcome,
+            "duration": round(duration, 3),
+            "time": time.time(),
+            **fields,
+        }
+        with self._lock:
+            self._append(entry)
+        return entry
+
+    def durations(self, function=None, inst_type=None):
+        # Sorted durations of the deploys that became ACTIVE or timed out
+        with self._lock:
+            if function is not None:
+                entries = list(self._entries.get(function, ()))
+            else:
+                entries = list(itertools.chain.from_iterable(self._entries.values()))
+        return sorted(
+            e["duration"] for e in entries
+            if e.get("outcome") in self.SAMPLE_OUTCOMES and (inst_type is None or e.get("inst_type") == inst_type)
+        )
+
+    def estimate(self, function, inst_type):
+        for basis, durations in (
+            ("function", self.durations(function=function)),
+            ("inst_type", self.durations(inst_type=inst_type)),
+        ):
+            if len(durations) >= self.MIN_SAMPLES:
+                return DeployEstimate(percentile(durations, 50), percentile(durations, 99), len(durations), basis)
+        return None
+
+
+class PreflightChecker:
+    # Checks that a function's container image and NGC model versions exist
+    # before anything is registered or deployed. Each image and model version
+    # is checked once per run, in parallel, and the answers are shared by every
+    # function using them. Only a definite "not found" is a problem; a registry
+    # or API that cannot be asked is logged and the function goes ahead
+    REGISTRY_HOST = "nvcr.io"
+    MANIFEST_TYPES = (
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.oci.image.manifest.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+        "application/vnd.docker.distribution.manifest.v2+json",
+    )
+
+    def __init__(self, client, registry_base, models_base, api_key_provider, max_workers=8):
+        self.client = client
+        self.registry_base = registry_base.rstrip("/")
+        self.models_base = models_base.rstrip("/")
+        self.api_key_provider = api_key_provider
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nvcf-preflight")
+        self._checks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        # Starts the checks for fn (if not already running) and returns their futures
+        futures = [self._check(("image", fn.image), self._check_image, fn.image)]
+        for model in fn.models:
+            key = ("model", fn.ngc_org, fn.ngc_team, model.uri, model.version)
+            futures.append(self._check(key, self._check_model, fn.ngc_org, fn.ngc_team, model.uri, model.version))
+        return futures
+
+    def problems(self, fn):
+        return [problem for future in self.submit(fn) if (problem := future.result())]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _check(self, key, check, *args):
+        with self._lock:
+            future = self._checks.get(key)
+            if future is None:
+                future = self._checks[key] = self._executor.submit(check, *args)
+            return future
+
+    @staticmethod
+    def split_image(image):
+        # (registry host, repository, tag or digest) of an image reference
+        host, _, rest = image.partition("/")
+        if not rest or not ("." in host or ":" in host or host == "localhost"):
+            host, rest = "docker.io", image
+        if "@" in rest:
+            repository, _, reference = rest.partition("@")
+        else:
+            repository, _, reference = rest.rpartition(":") if ":" in rest.rsplit("/", 1)[-1] else (rest, "", "")
+        return host, repository, reference or "latest"
+
+    def _check_image(self, image):
+        host, repository, reference = self.split_image(image)
+        if host != self.REGISTRY_HOST:
+            logger.info(f"Preflight: not checking {image}, only {self.REGISTRY_HOST} images are checked")
+            return None
+        url = f"{self.registry_base}/{repository}/manifests/{reference}"
+        headers = {"Accept": ", ".join(self.MANIFEST_TYPES), "Authorization": None, "Content-Type": None}
+        try:
+            response = self.client.head(url, headers=headers, phase="preflight", reauth=False)
+            if response.status_code == 401 and "WWW-Authenticate" in response.headers:
+                token = self._registry_token(response.headers["WWW-Authenticate"])
+                response = self.client.head(
+                    url, headers={**headers, "Authorization": f"Bearer {token}"}, phase="preflight", reauth=False
+                )
+        except (requests.RequestException, ValueError, KeyError) as err:
+            logger.warning(f"Preflight: could not check image {image}: {err!r}")
+            return None
+        if response.status_code == 404:
+            return f"image {image} not found in {host}"
+        if response.status_code != 200:
+            logger.warning(f"Preflight: could not check image {image}: HTTP {response.status_code}")
+        return None
+
+    def _registry_token(self, challenge):
+        # Docker registry token auth: the 401 names the token endpoint, which
+        # takes the NGC API key as the password of the $oauthtoken user
+        params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+        realm = params.pop("realm")
+        credentials = base64.b64encode(f"$oauthtoken:{self.api_key_provider()}".encode()).decode()
+        response = self.client.get(
+            realm, params=params, headers={"Authorization": f"Basic {credentials}"}, phase="preflight", reauth=False
+        )
+        response.raise_for_status()
+        body = response.json()
+        return body.get("token") or body["access_token"]
+
+    def _check_model(self, org, team, uri, version):
+        path = f"org/{org}/team/{team}" if team else f"org/{org}"
+        url = f"{self.models_base}/{path}/models/{uri}/versions/{version}"
+        try:
+            response = self.client.get(url, phase="preflight", reauth=False)
+        except requests.RequestException as err:
+            logger.warning(f"Preflight: could not check model {uri}:{version}: {err!r}")
+            return None
+        if response.status_code == 404:
+            return f"model {uri} version {version} not found in {path}"
+        if response.status_code != 200:
+            logger.warning(f"Preflight: could not check model {uri}:{version}: HTTP {response.status_code}")
+        return None
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def _to_str(value):
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"expected a string, got {type(value).__name__}")
+    return str(value)
+
+
+def _to_duration(value):
+    # Kept as written ("7d"), but parsed here so a bad value fails the manifest
+    # instead of the retention step after the deploy
+    value = _to_str(value)
+    parse_duration(value)
+    return value
+
+
+def _to_int(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"expected an integer, got {value!r}")
+    return int(value)
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValueError(f"expected a number, got {value!r}")
+    return float(value)
+
+
+def _to_dict(value):
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a mapping, got {type(value).__name__}")
+    return value
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("yes", "true", "on", "1"):
+        return True
+    if str(value).lower() in ("no", "false", "off", "0"):
+        return False
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def _to_list(value):
+    if not isinstance(value, list):
+        raise ValueError(f"expected a list, got {type(value).__name__}")
+    return value
+
+
+def _list_of(model):
+    def convert(value, where):
+        return [model.from_dict(item, f"{where}[{i}]") for i, item in enumerate(_to_list(value))]
+    convert.nested = True
+    return convert
+
+
+def _model(model):
+    def convert(value, where):
+        return model.from_dict(value, where)
+    convert.nested = True
+    return convert
+
+
+def _field(convert, required=False, default=None, default_factory=None):
+    metadata = {"convert": convert, "required": required}
+    if default_factory is not None:
+        return field(default_factory=default_factory, metadata=metadata)
+    return field(default=default, metadata=metadata)
+
+
+class _Model:
+    # Builds a slotted dataclass from a parsed dict, validating required fields
+    # and types once so a bad manifest fails before anything is deployed.
+    # Errors name the path to the bad value (Manifest.functions[0].inst_max).
+    # Not pydantic: the scripts are copied into other pipelines
+    # (docs/INTEGRATION.md) that install only PyYAML, Jinja2 and requests,
+    # pydantic's v1 and v2 APIs differ, and its import would be paid on every
+    # run (bench-nvcf.py startup). The models only need a few scalar converters
+    __slots__ = ()
+    WARN_UNKNOWN = True
+
+    @classmethod
+    def from_dict(cls, data, where=None):
+        where = where or cls.__name__
+        if isinstance(data, cls):
+            return data
+        if not isinstance(data, dict):
+            raise ManifestError(f"{where}: expected a mapping, got {type(data).__name__}")
+
+        kwargs = {}
+        known = set()
+        for f in fields(cls):
+            if not f.metadata:
+                continue
+            known.add(f.name)
+            value = data.get(f.name)
+            if value is None:
+                if f.metadata["required"]:
+                    raise ManifestError(f"{where}.{f.name}: required field is missing")
+                continue
+            convert = f.metadata["convert"]
+            try:
+                kwargs[f.name] = convert(value, f"{where}.{f.name}") if getattr(convert, "nested", False) else convert(value)
+            except (TypeError, ValueError) as err:
+                if isinstance(err, ManifestError):
+                    raise
+                raise ManifestError(f"{where}.{f.name}: {err}") from None
+
+        unknown = set(data) - known
+        if unknown and cls.WARN_UNKNOWN:
+            logger.warning(f"{where}: ignoring unknown key(s) {sorted(unknown)}")
+        record = cls(**kwargs)
+        record.validate(where)
+        return record
+
+    def validate(self, where):
+        pass
+
+
+@dataclass(slots=True)
+class EnvVar(_Model):
+    key: str = _field(_to_str, required=True)
+    value: str = _field(_to_str, default="")
+
+
+@dataclass(slots=True)
+class ModelSpec(_Model):
+    name: str = _field(_to_str, required=True)
+    version: str = _field(_to_str, required=True)
+    uri: str = _field(_to_str, required=True)
+
+
+@dataclass(slots=True)
+class ProbeSpec(_Model):
+    # Load and SLOs for the auto_test probe; unset SLOs are not checked
+    payload: dict = _field(_to_dict)
+    requests: int = _field(_to_int, default=50)
+    concurrency: int = _field(_to_int, default=4)
+    timeout: float = _field(_to_float, default=60.0)
+    slo_p50_ms: float = _field(_to_float)
+    slo_p95_ms: float = _field(_to_float)
+    slo_p99_ms: float = _field(_to_float)
+    slo_error_rate: float = _field(_to_float)
+    slo_min_rps: float = _field(_to_float)
+    slo_max_queue_depth: int = _field(_to_int)
+
+    def validate(self, where):
+        if self.requests < 1 or self.concurrency < 1:
+            raise ManifestError(f"{where}: requests and concurrency must be at least 1")
+
+
+@dataclass(slots=True)
+class CutoverSpec(_Model):
+    # How an update takes over from the serving version. "immediate" retires
+    # the old versions as soon as the new one is ACTIVE. "warm" first waits
+    # until the new version answers requests, takes a warm-up burst and its
+    # queue drains, then retires them all; "gradual" then retires the serving
+    # ones one per retire_interval, letting the queue drain in between
+    MODES = ("immediate", "warm", "gradual")
+
+    mode: str = _field(_to_str, default="immediate")
+    payload: dict = _field(_to_dict)
+    warmup_requests: int = _field(_to_int, default=20)
+    warmup_concurrency: int = _field(_to_int, default=4)
+    timeout: float = _field(_to_float, default=60.0)
+    ready_timeout: float = _field(_to_float, default=900.0)
+    settle_timeout: float = _field(_to_float, default=300.0)
+    queue_tolerance: int = _field(_to_int, default=0)
+    retire_interval: float = _field(_to_float, default=60.0)
+
+    def validate(self, where):
+        if self.mode not in self.MODES:
+            raise ManifestError(f"{where}: mode must be one of {', '.join(self.MODES)}, got {self.mode!r}")
+        if self.warmup_requests < 0 or self.warmup_concurrency < 1:
+            raise ManifestError(f"{where}: warmup_requests must be >= 0 and warmup_concurrency >= 1")
+
+
+@dataclass(slots=True)
+class Placement(_Model):
+    inst_backend: str = _field(_to_str, required=True)
+    inst_gpu_type: str = _field(_to_str, required=True)
+    inst_type: str = _field(_to_str, required=True)
+
+    def __str__(self):
+        return f"{self.inst_backend}/{self.inst_gpu_type}/{self.inst_type}"
+
+
+@dataclass(slots=True)
+class FunctionSpec(_Model):
+    type: str = _field(_to_str, required=True)
+    inferenceUrl: str = _field(_to_str, required=True)
+    inferencePort: int = _field(_to_int, required=True)
+    healthUri: str = _field(_to_str, required=True)
+    containerImage: str = _field(_to_str, required=True)
+    apiBodyFormat: str = _field(_to_str, required=True)
+    inst_backend: str = _field(_to_str, required=True)
+    inst_gpu_type: str = _field(_to_str, required=True)
+    inst_type: str = _field(_to_str, required=True)
+    inst_min: int = _field(_to_int, required=True)
+    inst_max: int = _field(_to_int, required=True)
+    inst_max_request_concurrency: int = _field(_to_int, default=1)
+    ngc_org: str = _field(_to_str)
+    ngc_team: str = _field(_to_str)
+    containerArgs: str = _field(_to_str)
+    containerEnvironment: list = _field(_list_of(EnvVar), default_factory=list)
+    models: list = _field(_list_of(ModelSpec), default_factory=list)
+    helmChart: str = _field(_to_str)
+    helmChartServiceName: str = _field(_to_str)
+    resources: list = _field(_to_list, default_factory=list)
+    auto_clean: bool = _field(_to_bool, default=False)
+    auto_test: bool = _field(_to_bool, default=False)
+    probe: ProbeSpec = _field(_model(ProbeSpec), default_factory=ProbeSpec)
+    cutover: CutoverSpec = _field(_model(CutoverSpec), default_factory=CutoverSpec)
+    keep_versions: int = _field(_to_int)
+    keep_newer_than: str = _field(_to_duration)
+    # Tried in order when the requested backend/GPU/instance type cannot be scheduled
+    placements: list = _field(_list_of(Placement), default_factory=list)
+    # Set while the function is categorized and deployed
+    name: str = None
+    current_id: str = None
+    current_version_id: str = None
+    current_status: str = None
+    old_versions: list = field(default_factory=list)
+    fingerprint: str = None
+    reg_url: str = None
+    deploy_url: str = None
+
+    def validate(self, where):
+        if self.inst_min > self.inst_max:
+            raise ManifestError(f"{where}: inst_min ({self.inst_min}) is greater than inst_max ({self.inst_max})")
+        if "nvcr.io" not in self.containerImage and not self.ngc_org:
+            raise ManifestError(f"{where}: ngc_org is required when containerImage is not a full nvcr.io path")
+        if self.models and not self.ngc_org:
+            raise ManifestError(f"{where}: ngc_org is required to mount models")
+
+    @property
+    def placement(self):
+        return Placement(self.inst_backend, self.inst_gpu_type, self.inst_type)
+
+    def place(self, placement):
+        self.inst_backend = placement.inst_backend
+        self.inst_gpu_type = placement.inst_gpu_type
+        self.inst_type = placement.inst_type
+
+    @property
+    def image(self):
+        if "nvcr.io" in self.containerImage:
+            return self.containerImage
+        return "/".join(p for p in ("nvcr.io", self.ngc_org, self.ngc_team, self.containerImage) if p)
+
+
+@dataclass(slots=True)
+class Manifest(_Model):
+    name: str = _field(_to_str, required=True)
+    functions: list = _field(_list_of(FunctionSpec), required=True)
+    function_alias: str = _field(_to_str)
+    manual_deploy: bool = _field(_to_bool, default=False)
+
+
+@dataclass(slots=True)
+class FunctionRecord(_Model):
+    # One function version as returned by the NVCF API
+    WARN_UNKNOWN = False
+
+    id: str = _field(_to_str, required=True)
+    versionId: str = _field(_to_str, required=True)
+    name: str = _field(_to_str, required=True)
+    status: str = _field(_to_str)
+    createdAt: str = _field(_to_str)
+    tags: list = _field(_to_list, default_factory=list)
+
+
+class ClusterCapacity:
+    # Backends (cluster groups), GPUs and instance types the org can deploy to,
+    # built from one list_cluster_groups response
+    def __init__(self, cluster_groups):
+        self.pools = {}
+        for group in cluster_groups or []:
+            for gpu in group.get("gpus") or []:
+                key = (str(group.get("name")).upper(), str(gpu.get("name")).upper())
+                types = self.pools.setdefault(key, set())
+                types.update(t.get("name") for t in gpu.get("instanceTypes") or [] if t.get("name"))
+
+    def __len__(self):
+        return len(self.pools)
+
+    def check(self, placement):
+        # None if the placement can be scheduled, otherwise the reason it cannot
+        backend, gpu = placement.inst_backend.upper(), placement.inst_gpu_type.upper()
+        if not any(b == backend for b, _ in self.pools):
+            return f"backend {placement.inst_backend} is not an available cluster group"
+        types = self.pools.get((backend, gpu))
+        if types is None:
+            return f"no {placement.inst_gpu_type} GPUs in {placement.inst_backend}"
+        if placement.inst_type not in types:
+            return f"instance type {placement.inst_type} is not offered for {placement.inst_gpu_type} in {placement.inst_backend}"
+        return None
+
+
+class FunctionInventory:
+    # Per-run snapshot of the org's functions indexed by name, unprefixed name
+    # (qa-/ai-) and status. Name buckets are kept sorted by versionId so the
+    # latest version of a function is a constant-time lookup. Updated in place
+    # as versions are created, deployed or deleted; only re-fetched when the
+    # optional TTL has expired
+    NAME_PREFIXES = ("qa-", "ai-")
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.fetched_at = None
+        self._lock = threading.RLock()
+        self._records = {}
+        self._by_name = {}
+        self._by_base_name = {}
+        self._by_status = {}
+
+    @classmethod
+    def base_name(cls, name):
+        for prefix in cls.NAME_PREFIXES:
+            if name and name.startswith(prefix):
+                return name[len(prefix):]
+        return name
+
+    def is_stale(self):
+        if self.fetched_at is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self.fetched_at > self.ttl
+
+    def invalidate(self):
+        # The next ensure_fresh fetches again
+        with self._lock:
+            self.fetched_at = None
+
+    def ensure_fresh(self, fetch):
+        # The lock makes concurrent callers wait for a single fetch
+        with self._lock:
+            if self.is_stale():
+                self.load(fetch())
+        return self
+
+    def __len__(self):
+        return len(self._records)
+
+    def load(self, functions):
+        with self._lock:
+            self._records = {}
+            self._by_name = {}
+            self._by_base_name = {}
+            self._by_status = {}
+            for function in functions:
+                record = self._as_record(function)
+                self._records[record.versionId] = record
+                self._by_name.setdefault(record.name, []).append((record.versionId, record))
+                self._by_base_name.setdefault(self.base_name(record.name), []).append((record.versionId, record))
+                self._by_status.setdefault(getattr(record, "status", None), {})[record.versionId] = record
+            # Sort each bucket once instead of inserting in order
+            for buckets in (self._by_name, self._by_base_name):
+                for bucket in buckets.values():
+                    bucket.sort(key=itemgetter(0))
+            self.fetched_at = time.monotonic()
+
+    def _as_record(self, function):
+        if isinstance(function, (dict, FunctionRecord)):
+            return FunctionRecord.from_dict(function)
+        return FunctionRecord.from_dict(vars(function))
+
+    def _index(self, record):
+        self._records[record.versionId] = record
+        insort(self._by_name.setdefault(record.name, []), (record.versionId, record), key=itemgetter(0))
+        insort(
+            self._by_base_name.setdefault(self.base_name(record.name), []),
+            (record.versionId, record),
+            key=itemgetter(0),
+        )
+        self._by_status.setdefault(getattr(record, "status", None), {})[record.versionId] = record
+
+    def _unindex(self, record):
+        self._records.pop(record.versionId, None)
+        self._bucket_remove(self._by_name.get(record.name), record.versionId)
+        self._bucket_remove(self._by_base_name.get(self.base_name(record.name)), record.versionId)
+        self._by_status.get(getattr(record, "status", None), {}).pop(record.versionId, None)
+
+    @staticmethod
+    def _bucket_remove(bucket, version_id):
+        if not bucket:
+            return
+        i = bisect_left(bucket, version_id, key=itemgetter(0))
+        if i < len(bucket) and bucket[i][0] == version_id:
+            del bucket[i]
+
+    @staticmethod
+    def _filter(bucket, statuses):
+        return [r for _, r in bucket if statuses is None or getattr(r, "status", None) in statuses]
+
+    def records(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def get(self, version_id):
+        with self._lock:
+            return self._records.get(version_id)
+
+    def lookup(self, *names, statuses=None):
+        # Versions matching any of the names, sorted by versionId
+        with self._lock:
+            buckets = [self._by_name[name] for name in dict.fromkeys(names) if name and name in self._by_name]
+            if len(buckets) == 1:
+                return self._filter(buckets[0], statuses)
+            return self._filter(merge(*buckets, key=itemgetter(0)), statuses)
+
+    def latest(self, *names, statuses=None):
+        versions = self.lookup(*names, statuses=statuses)
+        return versions[-1] if versions else None
+
+    def family(self, name, statuses=None):
+        # All versions named name, qa-name or ai-name, sorted by versionId
+        with self._lock:
+            return self._filter(self._by_base_name.get(self.base_name(name), []), statuses)
+
+    def by_status(self, status):
+        with self._lock:
+            return list(self._by_status.get(status, {}).values())
+
+    def upsert(self, function):
+        record = self._as_record(function)
+        with self._lock:
+            existing = self._records.get(record.versionId)
+            if existing is not None:
+                self._unindex(existing)
+            self._index(record)
+        return record
+
+    def set_status(self, version_id, status):
+        with self._lock:
+            record = self._records.get(version_id)
+            if record is None:
+                return None
+            self._unindex(record)
+            record.status = status
+            self._index(record)
+            return record
+
+    def remove(self, version_id):
+        with self._lock:
+            record = self._records.get(version_id)
+            if record is not None:
+                self._unindex(record)
+            return record
+
+
 class BaseClass:
     # Mapping of scopes to their corresponding API URLs
     SCOPE_API_MAP = {
@@ -17,9 +1555,34 @@ class BaseClass:
         "list_cluster_groups": "https://api.ngc.nvidia.com/v2/nvcf",
         "invoke_function": "https://api.nvcf.nvidia.com/v2/nvcf",
         "deploy_function": "https://api.ngc.nvidia.com/v2/nvcf",
-        "delete_function": "https://api.ngc.nvidia.com/v2/nvcf"
+        "delete_function": "https://api.ngc.nvidia.com/v2/nvcf",
+        "container_registry": "https://nvcr.io/v2",
+        "ngc_models": "https://api.ngc.nvidia.com/v2",
     }
 
+    # Record fields kept from the function listing, everything else is dropped while streaming
+    INVENTORY_FIELDS = ("id", "versionId", "name", "status", "createdAt", "tags")
+
+    def __init__(self, pool_size=10, inventory_ttl=None, list_visibility=None, api_base=None):
+        self.nvcf_api_key = None
+        self.spans = SpanRecorder()
+        # Point every scope at another host, e.g. the local mock-nvcf.py server
+        api_base = api_base or os.getenv("NVCF_API_BASE")
+        if api_base:
+            self.SCOPE_API_MAP = {
+                scope: api_base.rstrip("/") + urlsplit(url).path for scope, url in self.SCOPE_API_MAP.items()
+            }
+        self.inventory = FunctionInventory(ttl=inventory_ttl)
+        # Function names (without qa-/ai- prefix) to keep from the listing, None keeps all
+        self.inventory_names = None
+        self.list_visibility = list_visibility
+        self.client = NVCFClient(
+            token_provider=lambda: self.nvcf_api_key,
+            on_unauthorized=self.load_environment_variables,
+            pool_size=pool_size,
+            spans=self.spans,
+        )
+
     def load_environment_variables(self):
         # Determine the prefix based on the environment
         prefix = "PRD_" if self.environment == "production" else ""
@@ -38,21 +1601,40 @@ class BaseClass:
             return dictionary
 
     def _list_nvcf_fn(self, logger):
+        # The org listing is fetched once per run (or per TTL) and shared by all manifests
+        self.inventory.ensure_fresh(lambda: self._fetch_nvcf_fn(logger))
+
+    def _fetch_nvcf_fn(self, logger):
         url = self.SCOPE_API_MAP["list_functions"]
         # Check for functions and match by name
         logger.info(f"{self.job_name}: Listing NVCF functions.")
 
+        params = {"visibility": self.list_visibility} if self.list_visibility else None
+        names = (
+            {FunctionInventory.base_name(name) for name in self.inventory_names}
+            if self.inventory_names is not None
+            else None
+        )
+
         try:
-            headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.nvcf_api_key}"}
-            response = requests.get(f"{url}/functions", headers=headers)
+            response = self.client.get(f"{url}/functions", params=params, stream=True, phase="list")
             response.raise_for_status()
-            data = response.json()
 
-            if data is None or "functions" not in data:
-                logger.error("No functions data received from API")
+            # Parse the listing as it arrives and keep only the functions we manage
+            functions = []
+            seen = 0
+            with response, self.spans.span("list_parse") as span:
+                for function in iter_json_array(response.iter_content(chunk_size=65536), "functions"):
+                    seen += 1
+                    if names is not None and FunctionInventory.base_name(function.get("name")) not in names:
+                        continue
+                    functions.append({k: function.get(k) for k in self.INVENTORY_FIELDS})
+                span.update(seen=seen, kept=len(functions))
 
-            functions_list = data.get("functions", [])
-            self.functions_objects = [SimpleNamespace(**function) for function in functions_list]
+            if not seen:
+                logger.error("No functions data received from API")
+            logger.info(f"{self.job_name}: Kept {len(functions)} of {seen} function version(s).")
+            return functions
 
         except requests.HTTPError as http_err:
             logger.error(f"{self.job_name}: HTTP error occurred: {http_err}")
@@ -61,28 +1643,25 @@ class BaseClass:
             logger.error(traceback.format_exc())
             # Handle specific HTTP errors or re-raise
             raise
-        except requests.RequestException as req_err:
+        except (requests.RequestException, ValueError) as req_err:
             logger.error(f"{self.job_name}: Request error occurred: {req_err}")
             # Log the traceback for more detail
             logger.error(traceback.format_exc())
             # Handle other request-related errors or re-raise
             raise
 
-    def _digest_manifest(self, manifest_path, logger):
-        logger.info(f"{self.job_name}: Parsing Manifest at {manifest_path}")
-
-        with open(manifest_path, "r") as file:
-            manifest_data = yaml.safe_load(file)
-            if manifest_data is None:
-                logger.error(f"Manifest data is None. Check the YAML file at {manifest_path}")
-                sys.exit(1)  # or handle it appropriately
-        # Convert the dictionary to SimpleNamespace recursively
-        def convert_to_simple_namespace(d):
-            if isinstance(d, dict):
-                return SimpleNamespace(**{k: convert_to_simple_namespace(v) for k, v in d.items()})
-            elif isinstance(d, list):
-                return [convert_to_simple_namespace(item) for item in d]
-            else:
-                return d
+    def _digest_manifest(self, manifest_path, logger, manifest_data=None):
+        # manifest_data lets an already parsed manifest skip the disk round-trip,
+        # manifest_path is then only used in log messages
+        if manifest_data is None:
+            logger.info(f"{self.job_name}: Parsing Manifest at {manifest_path}")
+            with open(manifest_path, "r") as file:
+                manifest_data = load_yaml(file)
+        else:
+            logger.info(f"{self.job_name}: Loading rendered manifest {manifest_path}")
+
+        if manifest_data is None:
+            logger.error(f"Manifest data is None. Check the YAML file at {manifest_path}")
+            raise ManifestError(f"Empty manifest: {manifest_path}")
 
-        self.manifest = convert_to_simple_namespace(manifest_data)
+        self.manifest = Manifest.from_dict(manifest_data, where=os.path.basename(manifest_path))
@@ -1,21 +1,54 @@
 import json
 import os
 import yaml
-import requests
-from requests.exceptions import HTTPError
-from jinja2 import Environment, FileSystemLoader
 import time
+import heapq
+import hmac
+import http.client
+import signal
+import socket
+import socketserver
+import statistics
+import subprocess
 import sys
-from dataclasses import dataclass
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, field, replace
 import argparse
 from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
 import logging
 
-from common import BaseClass
+from common import (
+    FINGERPRINT_TAG_PREFIX,
+    BaseClass,
+    ClusterCapacity,
+    DeploymentFailed,
+    DeploymentHistory,
+    DeploymentJournal,
+    DeploymentPoller,
+    LoadProbe,
+    Manifest,
+    PreflightChecker,
+    ProbeFailed,
+    ProbeSpec,
+    lazy_import,
+    load_yaml,
+    log_context,
+    parse_duration,
+    spec_fingerprint,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("nvcf")
 
+requests = lazy_import("requests")
+jinja2 = lazy_import("jinja2")
+jinja2_meta = lazy_import("jinja2.meta")
+
 
 @dataclass
 class NVCFRunner(BaseClass):
@@ -25,32 +58,92 @@ class NVCFRunner(BaseClass):
     function_name: str = None
     environment: str = "test"
     debug_mode: bool = False
+    max_parallel: int = 1
+    inventory_ttl: float = None
+    list_visibility: str = None
+    force: bool = False
+    template_cache_dir: str = None
+    clean_parallel: int = 4
+    keep_versions: int = None
+    keep_newer_than: timedelta = None
+    journal_path: str = None
+    history_path: str = None
+    deploy_timeout: float = 3600.0
+    min_deploy_timeout: float = 600.0
+    resume: bool = True
+    check_placement: bool = True
+    preflight: bool = True
+    # Set on runners made by spawn(), which share the warm runner's state
+    warm: object = field(default=None, repr=False)
 
     def __post_init__(self):
-        # Initialize the base class
-        super().__init__()
-        self.deployment_successful = False
-        self.functions_objects = []
+        # Initialize the base class, sizing the connection pools for the workers
+        super().__init__(
+            pool_size=max(10, 2 * self.max_parallel),
+            inventory_ttl=self.inventory_ttl,
+            list_visibility=self.list_visibility,
+        )
         self.function_updates = []
         self.function_creates = []
+        self.deploy_futures = []
+        self.deploy_failures = []
+        self.skipped_functions = []
+        # Status requests for this runner's deployments; the poller is shared by spawned runners
+        self.status_requests = 0
+        self._template_envs = {}
+        self._template_vars = {}
+        self._source_env = None
+        self._preflight_checker = None
+        self._eta_queue = []
+        self._deploy_executor = None
+        self.cleanup_futures = []
+        self.cleanup_failures = []
+        self._cleanup_executor = None
+        self.capacity = None
+        self._failures_lock = threading.Lock()
+        if self.warm is not None:
+            # Connection pools, inventory, poller, journal, spans and compiled templates
+            self.client = self.warm.client
+            self.spans = self.warm.spans
+            self.inventory = self.warm.inventory
+            self.inventory_names = self.warm.inventory_names
+            self.poller = self.warm.poller
+            self.journal = self.warm.journal
+            self.history = self.warm.history
+            self.capacity = self.warm.capacity
+            self._template_envs = self.warm._template_envs
+            self._template_vars = self.warm._template_vars
+            self._source_env = self.warm._source_env
+            self.load_environment_variables()
+            return
+        self.poller = DeploymentPoller(self.client, workers=max(4, self.max_parallel))
+        self.journal = DeploymentJournal(self.journal_path) if self.journal_path else None
+        self.history = DeploymentHistory(self.history_path) if self.history_path else None
         self.load_environment_variables()
         logger.info("Starting NVCF Launcher")
         logger.info(f"job_name: {self.job_name}")
 
+    def spawn(self, **overrides):
+        # A runner for one rollout that reuses this runner's warm state
+        return replace(self, warm=self, **overrides)
+
+    # Span names for the requests made through _conf_nvcf
+    CONF_PHASES = {"function": "register", "deploy_function": "deploy", "delete_function": "delete"}
+
     def _conf_nvcf(self, nvcf_type, method="POST", payload=None, url=None):
+        phase = self.CONF_PHASES.get(nvcf_type, nvcf_type)
         if url is None:
             url = self.SCOPE_API_MAP[nvcf_type]
         logger.info(f"{self.job_name}: {method} - Configuring NVCF {nvcf_type}.")
         logger.info(f"{self.job_name}: {method} - {url}")
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.nvcf_api_key}"}
 
         try:
             if method.upper() == "POST":
                 logger.debug(f"Sending POST request to {url} with payload: {json.dumps(payload, indent=4)}")
-                response = requests.post(url, headers=headers, json=payload, timeout=30)
+                response = self.client.post(url, json=payload, phase=phase)
             elif method.upper() == "DELETE":
                 logger.debug(f"Sending DELETE request to {url} with payload: {json.dumps(payload, indent=4)}")
-                response = requests.delete(url, headers=headers, json=payload, timeout=30)
+                response = self.client.delete(url, json=payload, phase=phase)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
@@ -81,200 +174,102 @@ class NVCFRunner(BaseClass):
                 logger.error(f"Response content: {response.text}")
                 raise Exception("Unexpected content type")
 
-        except HTTPError as http_err:
-            logger.error(
-                f"Failed request details: URL: {url}, Payload: {json.dumps(payload, indent=4)}, Headers: {headers}"
-            )
+        except requests.HTTPError as http_err:
+            logger.error(f"Failed request details: URL: {url}, Payload: {json.dumps(payload, indent=4)}")
             logger.error(f"{self.job_name}: HTTP error occurred: {http_err}")
             logger.error(f"Response Body: {response.text if response.text else 'No msg body.'}")
-            if http_err.response.status_code == 401:
-                logger.info(f"{self.job_name}: 401 encountered - re-authenticating")
-                self._user_authentication_nvcf()
-            else:
-                raise Exception(f"HTTP error occurred: {http_err}")
+            raise Exception(f"HTTP error occurred: {http_err}")
 
-        except (requests.Timeout, ConnectionError) as err:
+        except (requests.Timeout, requests.ConnectionError) as err:
             logger.error(f"{self.job_name}: Failed to process NVCF {nvcf_type} with {method} request - {repr(err)}")
             raise Exception(f"Unreachable, please try again later: {err}")
 
-    def _poll_nvcf(
-        self, nvcf_type, success_check, method="get", payload=None, timeout=86400, interval=30, op="deploy", url=None
-    ):
-        if url is None:
-            url = self.SCOPE_API_MAP[nvcf_type]
-        timeout = float(timeout)
-        interval = float(interval)
-        start_time = time.time()
-        log_payload = {"requestBody": {"check": "log"}}
-        previous_log_content = ""
-        success = False
-
-        try:
-            while time.time() - start_time < timeout:
-                try:
-                    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.nvcf_api_key}"}
-                    if method == "get":
-                        response = requests.get(url, headers=headers)
-                    elif method == "post":
-                        response = requests.post(url, headers=headers, json=payload)
-                    else:
-                        raise ValueError(f"Unsupported HTTP method: {method}")
-
-                    logger.debug(f"Response status code: {response.status_code}")
-                    logger.debug(f"Response headers: {response.headers}")
-                    logger.debug(f"Response content: {response.content}")
-
-                    response.raise_for_status()
-
-                    if 'application/json' in response.headers.get('Content-Type', ''):
-                        data = response.json()
-                    else:
-                        logger.error(f"Unexpected content type: {response.headers.get('Content-Type')}")
-                        logger.error(f"Response content: {response.text}")
-                        raise Exception("Unexpected content type")
-
-                    logger.info(f"{self.job_name}: Waiting for NVCF function {op}")
-
-                    if payload and payload.get("requestBody", {}).get("check") == "status":
-                        log_response = requests.post(url, headers=headers, json=log_payload)
-                        log_response.raise_for_status()
-                        log_data = log_response.json()
-                        current_log_content = log_data.get("response", {}).get("log", "")
-
-                        if isinstance(current_log_content, str):
-                            new_log_content = current_log_content.replace(previous_log_content, "")
-                            if new_log_content.strip():
-                                logger.info(f"\n{new_log_content}")
-                            previous_log_content = current_log_content
-
-                    if success_check(data):
-                        success = True
-                        elapsed_time = time.time() - start_time
-                        logger.info(
-                            f"{self.job_name}: NVCF function met {op} success condition in"
-                            f" {elapsed_time:.2f} seconds."
-                        )
-                        return data
-
-                    time.sleep(interval)
-
-                except requests.HTTPError as http_err:
-                    logger.error(f"{self.job_name}: HTTP error occurred: {http_err}")
-                    logger.error(f"Response Body: {response.text if response.text else 'No msg body.'}")
-                    if http_err.response.status_code == 401:
-                        logger.info(f"{self.job_name}: 401 encountered - re-authenticating")
-                        self._user_authentication_nvcf(logger=logger)
-                        continue
-                    else:
-                        raise Exception(f"HTTP error occurred: {http_err}")
-
-                except (ConnectionError, ValueError) as err:
-                    raise Exception(f"Error while handling request: {err}")
-
-        finally:
-            if not success:
-                if op == "deploy":
-                    self.deployment_successful = False
-                raise TimeoutError(
-                    f"{self.job_name}: NVCF function did not meet success condition within"
-                    f" {int(time.time() - start_time)} seconds"
-                )
+    # Version states that count as an existing deployment of a function
+    MATCH_STATUSES = frozenset(("ACTIVE", "ERROR", "INACTIVE"))
 
     def categorize_functions(self):
         self.function_updates = []
         self.function_creates = []
 
-        if not self.functions_objects:
-            logger.error("functions_objects is None or empty.")
-
-        if not hasattr(self, "manifest") or not hasattr(self, "functions_objects"):
-            logger.error("Manifest or functions_objects not initialized")
+        if not hasattr(self, "manifest"):
+            logger.error("Manifest not initialized")
             return
 
-        if getattr(self.manifest, "manual_deploy", False):
+        if not len(self.inventory):
+            logger.error("Function inventory is empty.")
+
+        if self.manifest.manual_deploy:
             logger.info("Manual deploy nvcf-conf flag is set to true, skipping processing of creating NVCF")
-            exit(0)
+            return
 
         # Filter functions based on the type matching the environment
         relevant_functions = [fn for fn in self.manifest.functions if fn.type == self.environment]
+        manifest_alias = self.manifest.function_alias
 
         for fn in relevant_functions:
             fn_key = f"{'qa' if fn.type == 'test-' else ''}{self.manifest.name}"
-            manifest_alias = getattr(self.manifest, "function_alias", None)
-
-            # Collect all matching functions
-            matching_functions = [
-                f
-                for f in self.functions_objects
-                if (
-                    (
-                        f.name == fn_key
-                        or f.name == self.manifest.name
-                        or (manifest_alias and f.name == manifest_alias)
-                        or (manifest_alias and f.name == f"{'qa' if fn.type == 'test' else 'ai'}-{manifest_alias}")
-                    )
-                    and (f.status == "ACTIVE" or f.status == "ERROR" or f.status == "INACTIVE")
-                )
-            ]
+            prefixed_alias = f"{'qa' if fn.type == 'test' else 'ai'}-{manifest_alias}" if manifest_alias else None
+
+            # Matching versions come back sorted by versionId from the name index
+            matching_functions = self.inventory.lookup(
+                fn_key, self.manifest.name, manifest_alias, prefixed_alias, statuses=self.MATCH_STATUSES
+            )
             logger.info(f"Function version(s) match: {[func.versionId for func in matching_functions]}")
 
+            fn.name = self.manifest.name
             if matching_functions:
                 # Copy properties from the latest matching function to fn
-                latest_fn = max(matching_functions, key=lambda x: x.versionId)
-                fn.name = self.manifest.name
-                fn.current_id = getattr(latest_fn, "id", None)
-                fn.current_version_id = getattr(latest_fn, "versionId", None)
-                fn.current_status = getattr(latest_fn, "status", None)
+                latest_fn = matching_functions[-1]
+                fn.current_id = latest_fn.id
+                fn.current_version_id = latest_fn.versionId
+                fn.current_status = latest_fn.status
                 # Store all matching functions for potential deletion
                 fn.old_versions = [func.versionId for func in matching_functions]
                 self.function_updates.append(fn)
+                if bool(fn.auto_clean):
+                    logger.info(f"Function version(s) to delete: {fn.old_versions}")
             else:
-                fn.name = self.manifest.name
                 self.function_creates.append(fn)
 
         logger.info(f"Functions to update: {[func.name+' (ID: '+func.current_id+')' for func in self.function_updates]}")
         logger.info(f"Functions to create: {[func.name for func in self.function_creates]}")
 
-        if bool(fn.auto_clean):
-            logger.info(f"Function version(s) to delete: {[func.versionId for func in matching_functions]}")
-
     def _reconcile(self, fn_list, op="create"):
         for fn in fn_list:
             if fn is None:
                 logger.error("Encountered a None function in the list.")
                 continue
+            if not self._place(fn):
+                self._record_failure(fn.name, op, f"no schedulable placement among {self._candidates(fn)}")
+                continue
             nvcf_fr_payload = {
                 "name": f"{'qa' if fn.type == 'test' else 'ai'}-{fn.name}",
                 "inferenceUrl": fn.inferenceUrl,
                 "inferencePort": fn.inferencePort,
                 "healthUri": fn.healthUri,
-                "containerImage": f"{ fn.containerImage if 'nvcr.io' in fn.containerImage else '/'.join(['nvcr.io',{fn.ngc_org},{fn.ngc_team},{fn.containerImage}])}",
+                "containerImage": fn.image,
                 "apiBodyFormat": fn.apiBodyFormat,
             }
 
-            if getattr(fn, "containerEnvironment", None):
+            if fn.containerEnvironment:
                 nvcf_fr_payload["containerEnvironment"] = [
                     {"key": c.key, "value": c.value} for c in fn.containerEnvironment
                 ]
 
-            container_args = getattr(fn, "containerArgs", None)
-            if container_args is not None:
-                nvcf_fr_payload["containerArgs"] = container_args
+            if fn.containerArgs is not None:
+                nvcf_fr_payload["containerArgs"] = fn.containerArgs
 
             ### WIP
-            helm_chart = getattr(fn, "helmChart", None)
-            if helm_chart:
-                nvcf_fr_payload["helmChart"] = helm_chart
+            if fn.helmChart:
+                nvcf_fr_payload["helmChart"] = fn.helmChart
 
-            helm_chart_service_name = getattr(fn, "helmChartServiceName", None)
-            if helm_chart_service_name:
-                nvcf_fr_payload["helmChartServiceName"] = helm_chart
+            if fn.helmChartServiceName:
+                nvcf_fr_payload["helmChartServiceName"] = fn.helmChartServiceName
 
-            resources = getattr(fn, "resources", [])
-            if getattr(fn, "resources", []):
-                nvcf_fr_payload["resources"] = resources
+            if fn.resources:
+                nvcf_fr_payload["resources"] = fn.resources
 
-            if getattr(fn, "models", None):
+            if fn.models:
                 nvcf_fr_payload["models"] = [
                     {
                         "name": m.name,
@@ -292,17 +287,215 @@ class NVCFRunner(BaseClass):
                         "backend": fn.inst_backend,
                         "maxInstances": fn.inst_max,
                         "minInstances": fn.inst_min,
-                        "maxRequestConcurrency": getattr(fn, "inst_max_request_concurrency", 1),
+                        "maxRequestConcurrency": fn.inst_max_request_concurrency,
                     }
                 ]
             }
 
+            # Tag the version with a hash of what it was created from, so an
+            # unchanged spec can be recognised on the next run
+            fn.fingerprint = spec_fingerprint(nvcf_fr_payload, nvcf_fd_payload)
+            nvcf_fr_payload["tags"] = [f"{FINGERPRINT_TAG_PREFIX}{fn.fingerprint}"]
+
+            # A version this spec already registered in a cancelled run is picked back up
+            resume = self._resumable_version(fn, nvcf_fr_payload["name"])
+            if resume:
+                logger.info(
+                    f"{self.job_name}: {fn.name} resuming {resume['status']} version {resume['version_id']}"
+                    f" from the deployment journal"
+                )
+                fn.old_versions = [v for v in fn.old_versions if v != resume["version_id"]]
+            elif op == "update" and not self.force:
+                active_version = self._find_unchanged_version(fn, nvcf_fr_payload["name"])
+                if active_version:
+                    logger.info(
+                        f"{self.job_name}: {fn.name} matches ACTIVE version {active_version}, skipping redeploy"
+                        " (use --force to redeploy)"
+                    )
+                    self.skipped_functions.append(fn.name)
+                    continue
+
             # In debug mode, print the payloads and skip the API calls
             if self.debug_mode:
                 logger.info("nvcf_fr_payload: " + json.dumps(nvcf_fr_payload, indent=4))
                 logger.info("nvcf_fd_payload: " + json.dumps(nvcf_fd_payload, indent=4))
                 continue  # Skip to the next iteration
 
+            self._submit_deploy(fn, op, nvcf_fr_payload, nvcf_fd_payload, resume)
+
+    def _cluster_capacity(self):
+        # Cluster groups are listed once per run and shared by every function
+        if self.capacity is None:
+            url = f"{self.SCOPE_API_MAP['list_cluster_groups']}/clusterGroups"
+            try:
+                response = self.client.get(url, phase="cluster_groups")
+                response.raise_for_status()
+                self.capacity = ClusterCapacity(response.json().get("clusterGroups"))
+                logger.info(f"{self.job_name}: {len(self.capacity)} GPU pool(s) available across cluster groups")
+            except (requests.RequestException, ValueError) as err:
+                # Without the listing, placements are submitted unchecked as before
+                logger.warning(f"{self.job_name}: Could not list cluster groups, skipping placement checks: {err}")
+                self.capacity = ClusterCapacity(None)
+        return self.capacity
+
+    def _candidates(self, fn):
+        return [str(p) for p in [fn.placement, *fn.placements]]
+
+    def _place(self, fn):
+        # Move fn to the first of its requested and fallback placements that can be scheduled
+        if not self.check_placement:
+            return True
+        capacity = self._cluster_capacity()
+        if not len(capacity):
+            return True
+        for i, placement in enumerate([fn.placement, *fn.placements]):
+            reason = capacity.check(placement)
+            if reason is None:
+                if i:
+                    logger.info(f"{self.job_name}: {fn.name} falling back to {placement}")
+                    fn.place(placement)
+                return True
+            logger.warning(f"{self.job_name}: {fn.name} cannot use {placement}: {reason}")
+        return False
+
+    def _resumable_version(self, fn, journal_key):
+        if self.journal is None or not self.resume:
+            return None
+        entry = self.journal.get(journal_key)
+        if not entry or entry.get("step") not in ("registered", "deploying"):
+            return None
+        if entry.get("fingerprint") != fn.fingerprint:
+            logger.info(f"{self.job_name}: {fn.name} spec changed since the journaled attempt, starting over")
+            return None
+        # The listing is the source of truth: a deleted or failed version is not resumed
+        record = self.inventory.get(entry.get("version_id"))
+        if record is None or record.status == "ERROR":
+            logger.info(
+                f"{self.job_name}: {fn.name} journaled version {entry.get('version_id')} is"
+                f" {record.status if record else 'gone'}, starting over"
+            )
+            return None
+        entry["status"] = record.status
+        return entry
+
+    def _find_unchanged_version(self, fn, journal_key):
+        # An ACTIVE version carrying the same fingerprint tag is already what we
+        # would deploy, unless the journal recorded its attempt as failed
+        tag = f"{FINGERPRINT_TAG_PREFIX}{fn.fingerprint}"
+        entry = self.journal.get(journal_key) if self.journal is not None else None
+        failed = entry.get("version_id") if entry and entry.get("step") == "failed" else None
+        for version_id in fn.old_versions:
+            if version_id == failed:
+                continue
+            record = self.inventory.get(version_id)
+            if record is not None and record.status == "ACTIVE" and tag in record.tags:
+                return version_id
+        return None
+
+    def _submit_deploy(self, fn, op, nvcf_fr_payload, nvcf_fd_payload, resume=None):
+        if self._deploy_executor is None:
+            self._deploy_executor = ThreadPoolExecutor(
+                max_workers=max(1, self.max_parallel), thread_name_prefix="nvcf-deploy"
+            )
+        future = self._deploy_executor.submit(
+            self._deploy_isolated, fn, op, nvcf_fr_payload, nvcf_fd_payload, resume
+        )
+        self.deploy_futures.append(future)
+        self._eta_queue.append(self._deploy_estimate(fn))
+
+    # Deadline = this multiple of the p99 deploy time from the history
+    TIMEOUT_MARGIN = 1.5
+
+    def _deploy_estimate(self, fn):
+        return self.history.estimate(fn.name, fn.inst_type) if self.history is not None else None
+
+    def _deploy_deadline(self, estimate):
+        # Stuck deployments are given up on soon after the slowest recent ones
+        # finished, rather than after a fixed --deploy-timeout
+        if estimate is None:
+            return self.deploy_timeout
+        return min(self.deploy_timeout, max(self.min_deploy_timeout, estimate.p99 * self.TIMEOUT_MARGIN))
+
+    def rollout_eta(self):
+        # Seconds until the submitted deployments are expected to be ACTIVE,
+        # scheduling them over the deploy workers; None without any history
+        known = [estimate.p50 for estimate in self._eta_queue if estimate is not None]
+        if not known:
+            return None
+        fallback = statistics.median(known)
+        workers = [0.0] * max(1, self.max_parallel)
+        for estimate in self._eta_queue:
+            start = heapq.heappop(workers)
+            heapq.heappush(workers, start + (estimate.p50 if estimate is not None else fallback))
+        return max(workers)
+
+    def _deploy_isolated(self, fn, op, nvcf_fr_payload, nvcf_fd_payload, resume=None):
+        # Runs on a worker thread; a failing function is recorded instead of
+        # aborting the rollout of the others
+        log_context.name = fn.name
+        try:
+            self._deploy_fn(fn, op, nvcf_fr_payload, nvcf_fd_payload, resume)
+            logger.info(f"{self.job_name}: {op} finished successfully")
+        except Exception as e:
+            logger.error(f"{self.job_name}: {op} failed: {e}")
+            self._record_failure(fn.name, op, e)
+        finally:
+            log_context.name = None
+            log_context.version_id = None
+
+    def _count_status_request(self):
+        with self._failures_lock:
+            self.status_requests += 1
+
+    def _record_failure(self, name, op, err):
+        with self._failures_lock:
+            self.deploy_failures.append((name, op, str(err)))
+
+    def wait_for_deployments(self):
+        eta = self.rollout_eta()
+        if eta is not None:
+            unknown = sum(estimate is None for estimate in self._eta_queue)
+            logger.info(
+                f"{self.job_name}: {len(self._eta_queue)} deployment(s) expected ACTIVE in ~{format_seconds(eta)}"
+                f" (by {datetime.now() + timedelta(seconds=eta):%H:%M:%S})"
+                + (f", {unknown} without deploy history" if unknown else "")
+            )
+        self._eta_queue = []
+        for future in self.deploy_futures:
+            future.result()
+        self.deploy_futures = []
+        if self._deploy_executor is not None:
+            self._deploy_executor.shutdown(wait=True)
+            self._deploy_executor = None
+        if self.status_requests:
+            logger.info(f"{self.job_name}: {self.status_requests} deployment status request(s) sent")
+        if self._preflight_checker is not None:
+            self._preflight_checker.shutdown()
+            self._preflight_checker = None
+
+        # Cleanup was submitted by the deploy workers, so it is complete once they are
+        for future in self.cleanup_futures:
+            future.result()
+        self.cleanup_futures = []
+        if self._cleanup_executor is not None:
+            self._cleanup_executor.shutdown(wait=True)
+            self._cleanup_executor = None
+        for name, version_id, err in self.cleanup_failures:
+            logger.warning(f"{self.job_name}: {name}: old version {version_id} was not deleted: {err}")
+
+        if self.skipped_functions:
+            logger.info(f"{self.job_name}: Unchanged, not redeployed: {self.skipped_functions}")
+        for name, op, err in self.deploy_failures:
+            logger.error(f"{self.job_name}: {name} ({op}) failed: {err}")
+        if self.deploy_failures:
+            logger.error(f"{self.job_name}: {len(self.deploy_failures)} function(s) failed")
+        return self.deploy_failures
+
+    def _deploy_fn(self, fn, op, nvcf_fr_payload, nvcf_fd_payload, resume=None):
+        journal_key = nvcf_fr_payload["name"]
+        if resume:
+            function_id, version_id = resume["function_id"], resume["version_id"]
+        else:
             if op == "create":
                 o_url = f"{self.SCOPE_API_MAP['register_function']}/functions"
             elif op == "update":
@@ -311,47 +504,361 @@ class NVCFRunner(BaseClass):
             nvcf_fn = self._conf_nvcf(
                 nvcf_type="function", method="POST", payload=nvcf_fr_payload, url=o_url
             )
+            self.inventory.upsert(nvcf_fn.function)
+            function_id, version_id = nvcf_fn.function.id, nvcf_fn.function.versionId
+            self._journal(
+                journal_key, "registered", fingerprint=fn.fingerprint, function_id=function_id, version_id=version_id
+            )
+        log_context.version_id = version_id
 
-            self.nvcf_fn_reg_url = f"{self.SCOPE_API_MAP['update_function']}/functions/{nvcf_fn.function.id}/versions/{nvcf_fn.function.versionId}"
-            self.nvcf_fn_deploy_url = (
-                    f"{self.SCOPE_API_MAP['deploy_function']}/deployments/functions/{nvcf_fn.function.id}/versions/{nvcf_fn.function.versionId}"
-                )
-            logger.info(f"{self.job_name}: Initializing deployment for: {self.nvcf_fn_deploy_url}")
+        # Kept on the function rather than the runner, other workers share self
+        fn.reg_url = f"{self.SCOPE_API_MAP['update_function']}/functions/{function_id}/versions/{version_id}"
+        fn.deploy_url = (
+                f"{self.SCOPE_API_MAP['deploy_function']}/deployments/functions/{function_id}/versions/{version_id}"
+            )
 
-            time.sleep(2)
+        # A resumed version that is already provisioning (or done) is only polled
+        if not resume or resume["status"] not in ("DEPLOYING", "ACTIVE"):
+            logger.info(f"{self.job_name}: Initializing deployment for: {fn.deploy_url}")
+            if not resume:
+                time.sleep(2)
             self._conf_nvcf(
                 nvcf_type="deploy_function",
                 method="POST",
                 payload=nvcf_fd_payload,
-                url=self.nvcf_fn_deploy_url
+                url=fn.deploy_url
             )
-
-            self._poll_nvcf(
-                nvcf_type="deploy_function",
-                success_check=lambda data: data.get("deployment", {}).get("functionStatus", "") == "ACTIVE",
-                method="get",
-                timeout=3600,
-                interval=45,
-                op="deploy",
-                url=self.nvcf_fn_deploy_url
+            self._journal(journal_key, "deploying", deploy_url=fn.deploy_url)
+
+        # The shared poller checks every in-flight deployment and fails fast on ERROR.
+        # Past deploys of this function (or instance type) set the deadline and
+        # when to check most often
+        estimate = self._deploy_estimate(fn)
+        timeout = self._deploy_deadline(estimate)
+        if estimate is not None:
+            logger.info(
+                f"{self.job_name}: Waiting for NVCF function deploy, expected in ~{format_seconds(estimate.p50)}"
+                f" (p50 of {estimate.samples} {estimate.basis} deploys), giving up after {format_seconds(timeout)}"
+            )
+        else:
+            logger.info(f"{self.job_name}: Waiting for NVCF function deploy, giving up after {format_seconds(timeout)}")
+        started = time.monotonic()
+        if resume and resume["status"] == "DEPLOYING":
+            # Still provisioning since the last run: timed from its registration,
+            # unknown for entries journaled before registered_at was
+            registered_at = resume.get("registered_at")
+            started = started - (time.time() - registered_at) if registered_at else None
+        elif resume and resume["status"] == "ACTIVE":
+            # Became ACTIVE at some unknown point since the last run
+            started = None
+        try:
+            with self.spans.span("provision"):
+                self.poller.watch(
+                    fn.deploy_url,
+                    name=fn.name,
+                    timeout=timeout,
+                    expected=estimate.p50 if estimate is not None else None,
+                    on_poll=self._count_status_request,
+                ).result()
+        except DeploymentFailed:
+            # Timeouts and connection errors stay resumable, an ERROR does not
+            self._journal(journal_key, "failed")
+            self._record_history(fn, "ERROR", started, version_id)
+            raise
+        except TimeoutError:
+            self._record_history(fn, "TIMEOUT", started, version_id)
+            raise
+        self._record_history(fn, "ACTIVE", started, version_id)
+        self.inventory.set_status(version_id, "ACTIVE")
+
+        # A version that misses its SLOs or does not warm up fails the deploy,
+        # so auto_clean keeps the old ones
+        queue_limit = None
+        try:
+            if fn.auto_test:
+                self._auto_test(fn, function_id, version_id)
+            if op == "update" and fn.cutover.mode != "immediate" and self._serving_versions(fn):
+                queue_limit = self._warm_up(fn, function_id, version_id)
+        except Exception:
+            # Also when the version could not be withdrawn: the journal keeps
+            # it from being resumed or skipped as unchanged on the next run
+            self._journal(journal_key, "failed")
+            raise
+        self._journal(journal_key, "active")
+
+        # Clean old versions in the background so this worker can take the next function
+        if op == "update" and bool(fn.auto_clean):
+            records = self._versions_to_clean(fn)
+            if fn.cutover.mode == "gradual" and queue_limit is not None:
+                serving = [r for r in records if getattr(r, "status", None) == "ACTIVE"]
+                self._submit_cleanup(fn, [r for r in records if r not in serving])
+                self._submit_retirement(fn, serving, function_id, version_id, queue_limit)
+            else:
+                self._submit_cleanup(fn, records)
+
+    # Sent when the probe config has no payload; fits chat-completions inference URLs
+    PROBE_PAYLOAD = {"messages": [{"role": "user", "content": "Say hello."}], "max_tokens": 16}
+
+    def _auto_test(self, fn, function_id, version_id):
+        spec = fn.probe
+        probe = LoadProbe(
+            self.client,
+            self.SCOPE_API_MAP["invoke_function"],
+            self.SCOPE_API_MAP["queue_details"],
+            function_id,
+            version_id,
+        )
+        logger.info(
+            f"{self.job_name}: Probing {fn.inferenceUrl} with {spec.requests} request(s), {spec.concurrency} at a time"
+        )
+        with self.spans.span("probe") as span:
+            result = probe.run(spec, spec.payload or self.PROBE_PAYLOAD)
+            span.update(
+                requests=result.requests,
+                errors=result.errors,
+                rps=round(result.throughput, 3),
+                p50_ms=result.latency_ms(50),
+                p95_ms=result.latency_ms(95),
+                p99_ms=result.latency_ms(99),
+                max_queue_depth=result.max_queue_depth,
+            )
+        logger.info(f"{self.job_name}: Probe: {result.summary()}")
+        for error in result.error_samples:
+            logger.warning(f"{self.job_name}: Probe request failed: {error}")
+
+        missed = result.violations(spec)
+        if missed:
+            # A first version is withdrawn too, rather than left serving
+            self._withdraw(fn, version_id, "it missed its SLOs")
+            raise ProbeFailed(f"SLO missed: {'; '.join(missed)}")
+
+    def _withdraw(self, fn, version_id, reason):
+        # Any previous version is still deployed, take the new one back out
+        logger.warning(f"{self.job_name}: Undeploying {version_id}, {reason}")
+        self._conf_nvcf(nvcf_type="undeploy", method="DELETE", url=fn.deploy_url)
+        self.inventory.set_status(version_id, "INACTIVE")
+
+    def _serving_versions(self, fn):
+        records = (self.inventory.get(version_id) for version_id in fn.old_versions)
+        return [record for record in records if record is not None and record.status == "ACTIVE"]
+
+    def _cutover_probe(self, function_id, version_id):
+        return LoadProbe(
+            self.client,
+            self.SCOPE_API_MAP["invoke_function"],
+            self.SCOPE_API_MAP["queue_details"],
+            function_id,
+            version_id,
+        )
+
+    def _warm_up(self, fn, function_id, version_id):
+        # ACTIVE only means the instances passed their healthUri check. Before
+        # the old versions go, the new one has to answer a request through the
+        # invoke API, take a warm-up burst and drain its queue back to where it
+        # was. Returns that queue depth limit
+        spec = fn.cutover
+        payload = spec.payload or fn.probe.payload or self.PROBE_PAYLOAD
+        probe = self._cutover_probe(function_id, version_id)
+        logger.info(f"{self.job_name}: Warming up {version_id} before retiring the serving version(s)")
+        with self.spans.span("warm_up") as span:
+            waited, error = probe.wait_ready(payload, spec.ready_timeout, spec.timeout)
+            span["ready_s"] = round(waited, 3)
+            if error is not None:
+                self._withdraw(fn, version_id, f"it was not serving {spec.ready_timeout:g}s after ACTIVE")
+                raise ProbeFailed(f"not serving {spec.ready_timeout:g}s after ACTIVE: {error}")
+            logger.info(f"{self.job_name}: {version_id} answered a request {waited:.1f}s after ACTIVE")
+
+            queue_limit = (probe.queue_depth() or 0) + spec.queue_tolerance
+            if spec.warmup_requests:
+                burst = ProbeSpec(
+                    requests=spec.warmup_requests, concurrency=spec.warmup_concurrency, timeout=spec.timeout
+                )
+                result = probe.run(burst, payload)
+                span.update(requests=result.requests, errors=result.errors, p95_ms=result.latency_ms(95))
+                logger.info(f"{self.job_name}: Warm-up: {result.summary()}")
+                if not result.latencies:
+                    self._withdraw(fn, version_id, "it failed every warm-up request")
+                    raise ProbeFailed(f"warm-up failed: {'; '.join(result.error_samples) or 'no responses'}")
+
+            depth = probe.wait_queue(queue_limit, spec.settle_timeout)
+            span["queue_depth"] = depth
+            if depth is not None and depth > queue_limit:
+                self._withdraw(fn, version_id, "its queue did not drain after the warm-up")
+                raise ProbeFailed(f"queue depth {depth} still above {queue_limit} after {spec.settle_timeout:g}s")
+        return queue_limit
+
+    def _submit_retirement(self, fn, records, function_id, version_id, queue_limit):
+        if not records:
+            return
+        logger.info(
+            f"{self.job_name}: Retiring {len(records)} serving version(s) one every {fn.cutover.retire_interval:g}s"
+        )
+        self.cleanup_futures.append(
+            self._cleanup_pool().submit(self._retire_gradually, fn, records, function_id, version_id, queue_limit)
+        )
+
+    def _retire_gradually(self, fn, records, function_id, version_id, queue_limit):
+        # Each retirement moves more traffic onto the new version; the next
+        # waits until its queue is back down
+        probe = self._cutover_probe(function_id, version_id)
+        for i, record in enumerate(records):
+            if i:
+                time.sleep(fn.cutover.retire_interval)
+                depth = probe.wait_queue(queue_limit, fn.cutover.settle_timeout)
+                if depth is not None and depth > queue_limit:
+                    logger.warning(
+                        f"{self.job_name}: {fn.name}: queue depth {depth} on {version_id} is still above"
+                        f" {queue_limit}, retiring {record.versionId} anyway"
+                    )
+            self._delete_version(fn, record)
+
+    def _record_history(self, fn, outcome, started, version_id):
+        if self.history is not None and started is not None:
+            self.history.record(
+                fn.name,
+                fn.inst_type,
+                outcome,
+                time.monotonic() - started,
+                inst_backend=fn.inst_backend,
+                inst_gpu_type=fn.inst_gpu_type,
+                version_id=version_id,
             )
 
-            # Clean old versions
-            if op == "update" and bool(fn.auto_clean):
-                for old_version in fn.old_versions:
-                    d_url = f"{self.SCOPE_API_MAP['delete_function']}/functions/{fn.current_id}/versions/{old_version}"
-                    self._conf_nvcf(
-                        nvcf_type="delete_function",
-                        method="DELETE",
-                        url=d_url
+    def _journal(self, journal_key, step, **fields):
+        if self.journal is not None:
+            self.journal.record(journal_key, step, **fields)
+
+    def _versions_to_clean(self, fn):
+        # Retention: a function's keep_versions / keep_newer_than override the CLI defaults
+        keep_versions = fn.keep_versions if fn.keep_versions is not None else self.keep_versions
+        keep_newer_than = parse_duration(fn.keep_newer_than) if fn.keep_newer_than else self.keep_newer_than
+
+        records = []
+        for version_id in fn.old_versions:
+            record = self.inventory.get(version_id) or SimpleNamespace(versionId=version_id)
+            records.append((parse_timestamp(getattr(record, "createdAt", None)), record))
+        # Newest first; versions without a creation time sort as oldest
+        records.sort(key=lambda r: (r[0] or datetime.min.replace(tzinfo=timezone.utc), r[1].versionId), reverse=True)
+
+        if keep_versions:
+            kept = records[:keep_versions]
+            records = records[keep_versions:]
+            logger.info(f"{self.job_name}: Keeping {[r.versionId for _, r in kept]} (keep_versions={keep_versions})")
+        if keep_newer_than:
+            cutoff = datetime.now(timezone.utc) - keep_newer_than
+            records = [(created, r) for created, r in records if created is None or created < cutoff]
+        return [r for _, r in records]
+
+    def _cleanup_pool(self):
+        if self._cleanup_executor is None:
+            with self._failures_lock:
+                if self._cleanup_executor is None:
+                    self._cleanup_executor = ThreadPoolExecutor(
+                        max_workers=max(1, self.clean_parallel), thread_name_prefix="nvcf-clean"
                     )
+        return self._cleanup_executor
 
-    def render_template(self, template_filename, context, template_dir=''):
+    def _submit_cleanup(self, fn, records):
+        if not records:
+            return
+        executor = self._cleanup_pool()
+        logger.info(f"{self.job_name}: Deleting {len(records)} old version(s) in the background")
+        for record in records:
+            self.cleanup_futures.append(executor.submit(self._delete_version, fn, record))
+
+    def _delete_version(self, fn, record):
+        log_context.name = fn.name
+        log_context.version_id = record.versionId
+        try:
+            function_id = getattr(record, "id", None) or fn.current_id
+            d_url = f"{self.SCOPE_API_MAP['delete_function']}/functions/{function_id}/versions/{record.versionId}"
+            self._conf_nvcf(
+                nvcf_type="delete_function",
+                method="DELETE",
+                url=d_url
+            )
+            self.inventory.remove(record.versionId)
+        except Exception as e:
+            # A version that could not be deleted is reported, not fatal
+            with self._failures_lock:
+                self.cleanup_failures.append((fn.name, record.versionId, str(e)))
+        finally:
+            log_context.name = None
+            log_context.version_id = None
+
+    def _template_env(self, template_dir):
         template_dir = template_dir or os.getcwd()
-        env = Environment(loader=FileSystemLoader(template_dir))
-        template = env.get_template(template_filename)
+        # One environment per template dir, so each template is compiled once per run
+        env = self._template_envs.get(template_dir)
+        if env is None:
+            bytecode_cache = None
+            if self.template_cache_dir:
+                os.makedirs(self.template_cache_dir, exist_ok=True)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(self.template_cache_dir)
+            env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir), bytecode_cache=bytecode_cache, auto_reload=False)
+            self._template_envs[template_dir] = env
+        return env
+
+    def render_template(self, template_filename, context, template_dir=''):
+        template = self._template_env(template_dir).get_template(template_filename)
         return template.render(context)
 
+    def missing_template_vars(self, template_filename, context, template_dir=''):
+        # fn_ variables (launch list or FN_ environment) the manifest needs but
+        # that are unset or empty. The blanks are rendered as markers and looked
+        # for in the parsed manifest, so uses in YAML comments do not count
+        key = (template_dir, template_filename)
+        names = self._template_vars.get(key)
+        if names is None:
+            env = self._template_env(template_dir)
+            source = env.loader.get_source(env, template_filename)[0]
+            names = {n for n in jinja2_meta.find_undeclared_variables(env.parse(source)) if n.startswith("fn_")}
+            self._template_vars[key] = names
+        markers = {name: f"__unset_{name}__" for name in names if context.get(name) in (None, "")}
+        if not markers:
+            return []
+        rendered = json.dumps(load_yaml(self.render_template(template_filename, {**context, **markers}, template_dir)))
+        return sorted(name for name, marker in markers.items() if marker in rendered)
+
+    def preflight_checker(self):
+        if self._preflight_checker is None:
+            self._preflight_checker = PreflightChecker(
+                self.client,
+                self.SCOPE_API_MAP["container_registry"],
+                self.SCOPE_API_MAP["ngc_models"],
+                lambda: self.nvcf_api_key,
+                max_workers=max(4, self.max_parallel),
+            )
+        return self._preflight_checker
+
+    def prefetch_preflight(self, manifests):
+        # Starts every function's checks up front so they run while earlier manifests deploy
+        for _, manifest_data in manifests:
+            try:
+                manifest = Manifest.from_dict(manifest_data)
+            except Exception:
+                # Reported when the manifest is digested
+                continue
+            for fn in manifest.functions:
+                self.preflight_checker().submit(fn)
+
+    def run_preflight(self):
+        # Drops functions whose image or models do not exist before anything is registered
+        for fn_list, op in ((self.function_creates, "create"), (self.function_updates, "update")):
+            for fn in list(fn_list):
+                with self.spans.span("preflight", function=fn.name):
+                    problems = self.preflight_checker().problems(fn)
+                if problems:
+                    logger.error(f"{self.job_name}: {fn.name} failed preflight: {'; '.join(problems)}")
+                    self._record_failure(fn.name, op, f"preflight: {'; '.join(problems)}")
+                    fn_list.remove(fn)
+
+    def render_source(self, source, context):
+        # Renders template text that is not on disk, e.g. an older revision from git
+        if self._source_env is None:
+            self._source_env = jinja2.Environment(auto_reload=False)
+        return self._source_env.from_string(source).render(context)
+
     def create(self):
         if len(self.function_creates) >= 1:
             logger.info(f"{self.job_name}: Processing function registrations CREATE")
@@ -360,6 +867,24 @@ class NVCFRunner(BaseClass):
             logger.info(f"{self.job_name}: Processing function registrations UPDATE")
             self._reconcile(self.function_updates, op="update")
 
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    if seconds < 120:
+        return f"{seconds}s"
+    if seconds < 7200:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+def parse_timestamp(value):
+    # Aware datetime; a timestamp without an offset is taken as UTC
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
 def get_fn_env_vars():
     env_vars = {}
     for key, value in os.environ.items():
@@ -372,64 +897,187 @@ def get_fn_env_vars():
 def main():
     parser = argparse.ArgumentParser(description="Run the NVCF Launcher")
     parser.add_argument("--debug", action="store_true", help="Run in debug mode (skip runner.create())")
-    parser.add_argument("--manifest", type=str, help="Path to the YAML manifest file", required=True)
+    parser.add_argument("--manifest", type=str, help="Path to the YAML manifest file")
     parser.add_argument("--function-name", type=str, help="Function name(s) to limit the deployment to (comma-separated list or '*')")
+    parser.add_argument("--environment", type=str, help='Destination for NVCF deployment matching "type"')
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
     parser.add_argument(
-        "--environment", type=str, help='Destination for NVCF deployment matching "type"', required=True
+        "--max-parallel", type=int, default=1, help="Number of functions to register, deploy and clean concurrently"
+    )
+    parser.add_argument(
+        "--inventory-ttl",
+        type=float,
+        default=None,
+        help="Seconds before the cached function listing is fetched again (default: once per run)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Redeploy functions even if their spec matches the ACTIVE version"
+    )
+    parser.add_argument(
+        "--emit-manifests", action="store_true", help="Also write each rendered manifest to manifest-<fn_name>.yml"
+    )
+    parser.add_argument(
+        "--template-cache-dir", type=str, help="Directory for a Jinja bytecode cache shared across runs"
+    )
+    parser.add_argument("--clean-parallel", type=int, default=4, help="Concurrent deletes when cleaning old versions")
+    parser.add_argument(
+        "--keep-versions", type=int, default=None, help="Keep the N most recent old versions when auto_clean is on"
+    )
+    parser.add_argument(
+        "--keep-newer-than",
+        type=parse_duration,
+        default=None,
+        help="Keep old versions created within this window, e.g. 12h or 7d",
+    )
+    parser.add_argument(
+        "--list-visibility",
+        type=str,
+        default=None,
+        help="Server-side visibility filter for the function listing (authorized, private or public)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=".nvcf-journal.jsonl",
+        help="Deployment journal used to resume in-flight deployments ('' to disable)",
+    )
+    parser.add_argument(
+        "--history",
+        type=str,
+        default=".nvcf-history.jsonl",
+        help="Deploy duration history used for deadlines, poll timing and ETAs ('' to disable)",
+    )
+    parser.add_argument(
+        "--deploy-timeout",
+        type=float,
+        default=3600.0,
+        help="Seconds to wait for a deployment to become ACTIVE (without history, and at most with it)",
+    )
+    parser.add_argument(
+        "--min-deploy-timeout",
+        type=float,
+        default=600.0,
+        help="Shortest deadline the deploy history can set, in seconds",
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true", help="Ignore the journal and register new versions for every function"
+    )
+    parser.add_argument(
+        "--skip-placement-check",
+        action="store_true",
+        help="Submit the requested backend/GPU/instance type without checking the cluster groups",
+    )
+    parser.add_argument(
+        "--skip-preflight",
+        action="store_true",
+        help="Do not check images, NGC models and FN_ template variables before registering",
+    )
+    parser.add_argument(
+        "--changed-since",
+        type=str,
+        help="Only deploy functions that render differently than at this git revision (e.g. HEAD~1)",
+    )
+    parser.add_argument(
+        "--list-changed", action="store_true", help="Print the selected function names comma-separated and exit"
+    )
+    parser.add_argument(
+        "--serve", type=str, help="Run as a daemon with a deploy API on host:port or unix:/path/to/socket"
+    )
+    parser.add_argument("--max-rollouts", type=int, default=4, help="Daemon: rollouts run at the same time")
+    parser.add_argument(
+        "--watch-interval", type=float, default=2.0, help="Daemon: seconds between launch-list.yml change checks"
+    )
+    parser.add_argument(
+        "--deploy-on-change", action="store_true", help="Daemon: roll out functions whose manifest changed on disk"
+    )
+    parser.add_argument(
+        "--daemon", type=str, help="Submit the rollout to the daemon at host:port or unix:/path and return"
+    )
+    parser.add_argument("--wait", action="store_true", help="With --daemon, wait for the rollout to finish")
+    parser.add_argument("--wait-interval", type=float, default=5.0, help="With --wait, seconds between status checks")
+    parser.add_argument("--report-json", type=str, help="Write the per-phase timing spans to this JSON file")
+    parser.add_argument(
+        "--report-prom", type=str, help="Write per-phase timing metrics to this Prometheus textfile"
     )
-    parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
 
     args = parser.parse_args()
 
+    # The daemon already has the manifest, environment and a warm inventory
+    if args.daemon:
+        submit_to_daemon(args)
+        return
+    if not args.manifest or not args.environment:
+        parser.error("--manifest and --environment are required")
+    if args.serve and not args.serve.startswith("unix:") and not os.getenv("NVCF_DAEMON_TOKEN"):
+        host = args.serve.rpartition(":")[0] or "127.0.0.1"
+        if host not in ("127.0.0.1", "localhost"):
+            parser.error("--serve on a non-loopback address needs NVCF_DAEMON_TOKEN set")
+    if args.serve and args.inventory_ttl is None:
+        # A long-running daemon re-lists functions now and then to see changes made elsewhere
+        args.inventory_ttl = 300.0
+
     runner = NVCFRunner(
         job_name="Launcher",
         env_vars={},
         backend="GitHub",
         function_name=args.function_name,
         environment=args.environment,
-        debug_mode=args.debug
+        debug_mode=args.debug,
+        max_parallel=args.max_parallel,
+        inventory_ttl=args.inventory_ttl,
+        list_visibility=args.list_visibility,
+        force=args.force,
+        template_cache_dir=args.template_cache_dir,
+        clean_parallel=args.clean_parallel,
+        keep_versions=args.keep_versions,
+        keep_newer_than=args.keep_newer_than,
+        journal_path=args.journal or None,
+        history_path=args.history or None,
+        deploy_timeout=args.deploy_timeout,
+        min_deploy_timeout=min(args.min_deploy_timeout, args.deploy_timeout),
+        resume=not args.no_resume,
+        check_placement=not args.skip_placement_check,
+        preflight=not args.skip_preflight,
     )
 
     manifest_path = args.manifest
     file_extension = os.path.splitext(manifest_path)[1]
 
+    if args.serve:
+        if file_extension != '.j2':
+            parser.error("--serve needs a .j2 template manifest")
+        serve(runner, manifest_path, args)
+        return
+
     if file_extension == '.j2':
         with open('launch-list.yml') as file:
-            launch_list = yaml.safe_load(file)
+            launch_list = load_yaml(file)
 
         template_dir = os.path.dirname(manifest_path)
         template_filename = os.path.basename(manifest_path)
 
-        # Separate top-level variables and functions
-        top_level_vars = {k: v for k, v in launch_list.items() if k != 'functions'}
-
         # Get environment variables with 'FN_' prefix
         fn_env_vars = get_fn_env_vars()
 
-        if args.function_name:
-            function_names = [fn.strip() for fn in args.function_name.split(',')]
-            if '*' in function_names:
-                launch_list['functions'] = launch_list.get('functions', [])
-            else:
-                launch_list['functions'] = [
-                    fn for fn in launch_list.get('functions', []) 
-                    if fn.get('fn_name') in function_names
-                ]
+        functions = select_functions(launch_list, args.function_name)
 
-        for launch_config in launch_list.get('functions', []):
-            # Merge in this order: YAML vars -> function-specific vars -> FN_ env vars
-            context = {**top_level_vars, **launch_config, **fn_env_vars}
-            
-            rendered_manifest = runner.render_template(template_filename, context, template_dir)
-            temp_manifest_path = f"manifest-{launch_config.get('fn_name', 'null')}.yml"
-            with open(temp_manifest_path, 'w') as temp_manifest:
-                temp_manifest.write(rendered_manifest)
-            
-            if args.debug:
-                logger.info(f"Debug mode: Rendered manifest saved to {temp_manifest_path}")
-                continue
+        if args.changed_since:
+            changed = changed_functions(
+                runner, args.changed_since, launch_list, functions, template_dir, template_filename, fn_env_vars
+            )
+            if changed is not None:
+                logger.info(f"Functions changed since {args.changed_since}: {changed}")
+                functions = [fn for fn in functions if fn.get('fn_name') in changed]
+
+        if args.list_changed:
+            print(",".join(str(fn.get('fn_name')) for fn in functions))
+            return
 
-            process_manifest(runner, temp_manifest_path, args.debug)
+        manifests = render_manifests(
+            runner, launch_list, functions, template_dir, template_filename, fn_env_vars,
+            emit=args.emit_manifests, debug=args.debug,
+        )
+        deploy_manifests(runner, manifests, args.debug)
 
     elif file_extension in ['.yml', '.yaml']:
         if not args.debug:
@@ -441,20 +1089,548 @@ def main():
         logger.error("Unsupported manifest file format.")
         sys.exit(1)
 
-def process_manifest(runner, manifest_path, debug_mode):
+    failures = runner.wait_for_deployments()
+    write_reports(runner, args)
+    if failures:
+        sys.exit(1)
+
+def select_functions(launch_list, function_name):
+    # launch-list.yml entries named in a comma-separated list, or all of them for '*' (or no filter)
+    functions = launch_list.get('functions', [])
+    if not function_name:
+        return list(functions)
+    function_names = [fn.strip() for fn in function_name.split(',')]
+    if '*' in function_names:
+        return list(functions)
+    return [fn for fn in functions if fn.get('fn_name') in function_names]
+
+def render_manifests(runner, launch_list, functions, template_dir, template_filename, fn_env_vars, emit=False, debug=False):
+    # Separate top-level variables and functions
+    top_level_vars = {k: v for k, v in launch_list.items() if k != 'functions'}
+
+    manifests = []
+    for launch_config in functions:
+        # Merge in this order: YAML vars -> function-specific vars -> FN_ env vars
+        context = {**top_level_vars, **launch_config, **fn_env_vars}
+
+        with runner.spans.span("render", function=launch_config.get('fn_name')):
+            rendered_manifest = runner.render_template(template_filename, context, template_dir)
+        temp_manifest_path = f"manifest-{launch_config.get('fn_name', 'null')}.yml"
+        # The rendered manifest is parsed in memory; files are only for inspection
+        if emit or debug:
+            with open(temp_manifest_path, 'w') as temp_manifest:
+                temp_manifest.write(rendered_manifest)
+
+        if debug:
+            logger.info(f"Debug mode: Rendered manifest saved to {temp_manifest_path}")
+            continue
+
+        try:
+            manifest_data = load_yaml(rendered_manifest)
+        except yaml.YAMLError as e:
+            logger.error(f"Rendered manifest {temp_manifest_path} is not valid YAML: {e}")
+            runner._record_failure(temp_manifest_path, "manifest", e)
+            continue
+
+        # A blank FN_ variable would otherwise only fail once the container starts
+        missing = runner.missing_template_vars(template_filename, context, template_dir) if runner.preflight else []
+        if missing:
+            reason = f"preflight: empty or unset template variable(s) {', '.join(missing)}"
+            logger.error(f"{launch_config.get('fn_name')} failed {reason}")
+            runner._record_failure(launch_config.get('fn_name'), "manifest", reason)
+            continue
+        manifests.append((temp_manifest_path, manifest_data))
+    return manifests
+
+def deploy_manifests(runner, manifests, debug_mode):
+    # Knowing every name up front lets the listing drop unrelated functions as it streams
+    if runner.inventory_names is None:
+        runner.inventory_names = set()
+        for _, manifest_data in manifests:
+            runner.inventory_names.update(manifest_names(manifest_data))
+    if runner.preflight and not debug_mode:
+        runner.prefetch_preflight(manifests)
+    for temp_manifest_path, manifest_data in manifests:
+        process_manifest(runner, temp_manifest_path, debug_mode, manifest_data=manifest_data)
+
+def write_reports(runner, args):
+    runner.spans.log_summary(logger)
+    if args.report_json:
+        runner.spans.write_json(args.report_json)
+        logger.info(f"Timing report written to {args.report_json}")
+    if args.report_prom:
+        runner.spans.write_prometheus(args.report_prom)
+        logger.info(f"Timing metrics written to {args.report_prom}")
+
+def resolve_commit(rev):
+    # Commit id a git revision names, or None if it names none. rev can come from
+    # the daemon's POST /rollouts, so it must never be read as a git option
+    if not isinstance(rev, str) or not rev or rev.startswith("-"):
+        return None
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--verify", "--quiet", "--end-of-options", f"{rev}^{{commit}}"],
+            capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def git_show(commit, path):
+    # File contents at a commit from resolve_commit, or None if it is not there
+    try:
+        result = subprocess.run(
+            ["git", "show", f"{commit}:./{os.path.normpath(path)}"], capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+def changed_functions(runner, rev, launch_list, functions, template_dir, template_filename, fn_env_vars):
+    # fn_names whose manifest renders differently now than from rev's launch list
+    # and template (with today's FN_ context), or None if rev cannot be read
+    commit = resolve_commit(rev)
+    if commit is None:
+        logger.warning(f"{rev!r} is not a git commit, deploying every function")
+        return None
+    old_launch_list = git_show(commit, 'launch-list.yml')
+    old_template = git_show(commit, os.path.join(template_dir, template_filename))
+    if old_launch_list is None or old_template is None:
+        logger.warning(f"Could not read launch-list.yml or the template at {rev}, deploying every function")
+        return None
+    old_launch_list = load_yaml(old_launch_list) or {}
+    top_level_vars = {k: v for k, v in launch_list.items() if k != 'functions'}
+    old_top_level_vars = {k: v for k, v in old_launch_list.items() if k != 'functions'}
+    old_configs = {fn.get('fn_name'): fn for fn in old_launch_list.get('functions', [])}
+
+    changed = []
+    for launch_config in functions:
+        name = launch_config.get('fn_name')
+        old_config = old_configs.get(name)
+        if old_config is None:
+            changed.append(name)
+            continue
+        rendered = runner.render_template(
+            template_filename, {**top_level_vars, **launch_config, **fn_env_vars}, template_dir
+        )
+        old_rendered = runner.render_source(old_template, {**old_top_level_vars, **old_config, **fn_env_vars})
+        if renders_differ(rendered, old_rendered):
+            changed.append(name)
+    return changed
+
+def renders_differ(rendered, old_rendered):
+    # Compared as parsed YAML, so whitespace and comments in the template do not count
     try:
-        runner._digest_manifest(manifest_path=manifest_path, logger=logger)
+        return load_yaml(rendered) != load_yaml(old_rendered)
+    except yaml.YAMLError:
+        return rendered != old_rendered
+
+def manifest_names(manifest_data):
+    # Function names a manifest can match in the org listing
+    if not isinstance(manifest_data, dict):
+        return set()
+    return {str(n) for n in (manifest_data.get("name"), manifest_data.get("function_alias")) if n}
+
+def process_manifest(runner, manifest_path, debug_mode, manifest_data=None):
+    try:
+        with runner.spans.span("digest", manifest=manifest_path):
+            runner._digest_manifest(manifest_path=manifest_path, logger=logger, manifest_data=manifest_data)
         runner._list_nvcf_fn(logger=logger)
-        runner.categorize_functions()
+        with runner.spans.span("categorize", function=runner.manifest.name):
+            runner.categorize_functions()
         
         if not debug_mode:
+            if runner.preflight:
+                runner.run_preflight()
             runner.create()
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         logger.error(f"Manifest file not found: {manifest_path}")
-        sys.exit(1)
+        runner._record_failure(manifest_path, "manifest", e)
     except Exception as e:
         logger.error(f"An error occurred: {e}")
+        runner._record_failure(manifest_path, "manifest", e)
+
+class RolloutConflict(Exception):
+    pass
+
+class LauncherDaemon:
+    # Keeps a warm NVCFRunner (function inventory, connection pools, compiled
+    # template, parsed launch list) and runs rollouts submitted over the local
+    # API on worker threads, one spawned runner per rollout
+    # Finished rollouts and raw timing spans kept for the API; the metrics
+    # still count every span
+    KEEP_ROLLOUTS = 100
+    KEEP_SPANS = 10000
+
+    def __init__(self, runner, manifest_path, launch_list_path='launch-list.yml', max_rollouts=4,
+                 watch_interval=2.0, deploy_on_change=False):
+        self.runner = runner
+        self.template_dir = os.path.dirname(manifest_path)
+        self.template_filename = os.path.basename(manifest_path)
+        self.manifest_path = manifest_path
+        self.launch_list_path = launch_list_path
+        self.watch_interval = watch_interval
+        self.deploy_on_change = deploy_on_change
+        self.fn_env_vars = get_fn_env_vars()
+        self.started = time.time()
+        self.rollouts = {}
+        self.launch_list = {}
+        self._rendered = {}
+        self._mtimes = None
+        self._busy = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_rollouts), thread_name_prefix="nvcf-rollout")
+        self.runner.spans.keep_last(self.KEEP_SPANS)
+        self.reload()
+
+    def _file_mtimes(self):
+        return tuple(
+            os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            for path in (self.launch_list_path, self.manifest_path)
+        )
+
+    def reload(self):
+        # Re-read launch-list.yml and recompile the template; returns the
+        # fn_names whose rendered manifest changed
+        with open(self.launch_list_path) as file:
+            launch_list = load_yaml(file) or {}
+        self._mtimes = self._file_mtimes()
+        self.runner._template_envs.clear()
+        self.runner._template_vars.clear()
+        self.runner.capacity = None
+
+        top_level_vars = {k: v for k, v in launch_list.items() if k != 'functions'}
+        rendered = {}
+        for launch_config in launch_list.get('functions', []):
+            context = {**top_level_vars, **launch_config, **self.fn_env_vars}
+            try:
+                rendered[launch_config.get('fn_name')] = self.runner.render_template(
+                    self.template_filename, context, self.template_dir
+                )
+            except Exception as e:
+                logger.error(f"Daemon: {launch_config.get('fn_name')} does not render: {e}")
+        changed = [
+            name for name, manifest in rendered.items()
+            if name not in self._rendered or renders_differ(manifest, self._rendered[name])
+        ]
+
+        names = set()
+        for manifest in rendered.values():
+            try:
+                names.update(manifest_names(load_yaml(manifest)))
+            except yaml.YAMLError:
+                continue
+        with self._lock:
+            if self.runner.inventory_names is None or not names <= self.runner.inventory_names:
+                # New functions were filtered out of the cached listing
+                self.runner.inventory.invalidate()
+            self.runner.inventory_names = names
+            self.launch_list = launch_list
+            self._rendered = rendered
+        logger.info(f"Daemon: Loaded {len(rendered)} function(s) from {self.launch_list_path}")
+        return changed
+
+    def warm_up(self):
+        self.runner._list_nvcf_fn(logger=logger)
+
+    def watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                if self._file_mtimes() != self._mtimes:
+                    changed = self.reload()
+                    logger.info(f"Daemon: Launch list or template changed, functions affected: {changed}")
+                    if self.deploy_on_change:
+                        self._pending.update(changed)
+                if self._pending:
+                    self._submit_pending()
+            except Exception as e:
+                logger.error(f"Daemon: Reload failed: {e}")
+
+    def _submit_pending(self):
+        # Changed functions that are mid-rollout wait for it to finish
+        with self._lock:
+            ready = sorted(name for name in self._pending if name not in self._busy)
+        if ready:
+            self.submit(function_name=",".join(ready))
+            self._pending.difference_update(ready)
+
+    def submit(self, function_name="*", force=False, changed_since=None):
+        with self._lock:
+            launch_list = self.launch_list
+        functions = select_functions(launch_list, function_name)
+        if changed_since:
+            changed = changed_functions(
+                self.runner, changed_since, launch_list, functions, self.template_dir, self.template_filename,
+                self.fn_env_vars,
+            )
+            if changed is not None:
+                functions = [fn for fn in functions if fn.get('fn_name') in changed]
+        names = [fn.get('fn_name') for fn in functions]
+
+        with self._lock:
+            # A function is only ever rolled out by one rollout at a time
+            busy = {name: self._busy[name] for name in names if name in self._busy}
+            if busy:
+                raise RolloutConflict(f"already rolling out: {busy}")
+            rollout = {
+                "id": uuid.uuid4().hex[:12],
+                "state": "queued",
+                "functions": names,
+                "force": bool(force),
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "skipped": [],
+                "failures": [],
+            }
+            self.rollouts[rollout["id"]] = rollout
+            for name in names:
+                self._busy[name] = rollout["id"]
+        self._executor.submit(self._run, rollout, launch_list, functions)
+        logger.info(f"Daemon: Rollout {rollout['id']} queued for {names}")
+        return rollout
+
+    def _run(self, rollout, launch_list, functions):
+        rollout["state"] = "running"
+        rollout["started"] = time.time()
+        try:
+            runner = self.runner.spawn(force=rollout["force"], job_name=f"Rollout {rollout['id']}")
+            manifests = render_manifests(
+                runner, launch_list, functions, self.template_dir, self.template_filename, self.fn_env_vars
+            )
+            deploy_manifests(runner, manifests, False)
+            failures = runner.wait_for_deployments()
+            self.runner.capacity = self.runner.capacity or runner.capacity
+            rollout["skipped"] = list(runner.skipped_functions)
+            rollout["failures"] = [{"function": name, "op": op, "error": err} for name, op, err in failures]
+            rollout["state"] = "failed" if failures else "succeeded"
+        except Exception as e:
+            logger.error(f"Daemon: Rollout {rollout['id']} failed: {e}")
+            rollout["failures"].append({"function": None, "op": "rollout", "error": str(e)})
+            rollout["state"] = "failed"
+        finally:
+            rollout["finished"] = time.time()
+            with self._lock:
+                for name in rollout["functions"]:
+                    if self._busy.get(name) == rollout["id"]:
+                        del self._busy[name]
+                finished = [rollout_id for rollout_id, r in self.rollouts.items() if r["finished"] is not None]
+                for rollout_id in finished[:-self.KEEP_ROLLOUTS]:
+                    del self.rollouts[rollout_id]
+            logger.info(f"Daemon: Rollout {rollout['id']} {rollout['state']}")
+
+    def list_rollouts(self):
+        with self._lock:
+            return list(self.rollouts.values())
+
+    def get_rollout(self, rollout_id):
+        with self._lock:
+            return self.rollouts.get(rollout_id)
+
+    def status(self):
+        inventory = self.runner.inventory
+        with self._lock:
+            return {
+                "uptime": time.time() - self.started,
+                "functions": sorted(str(name) for name in self._rendered),
+                "inventory_versions": len(inventory),
+                "inventory_age": (
+                    time.monotonic() - inventory.fetched_at if inventory.fetched_at is not None else None
+                ),
+                "rolling_out": dict(self._busy),
+                "rollouts": {state: sum(r["state"] == state for r in self.rollouts.values())
+                             for state in ("queued", "running", "succeeded", "failed")},
+            }
+
+    def shutdown(self):
+        # Queued rollouts are dropped and running ones drain; if the daemon is
+        # killed instead, the journal lets the next start resume them
+        running = [r["id"] for r in self.list_rollouts() if r["state"] == "running"]
+        if running:
+            logger.info(f"Daemon: Waiting for running rollout(s) {running} to finish")
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _reply(self, status, payload, content_type="application/json"):
+        data = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        # With a token set, every request has to carry it
+        token = self.server.token
+        if token is None or hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+            return True
+        self._reply(401, {"detail": "Missing or wrong bearer token"})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        daemon = self.server.daemon
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/status":
+            self._reply(200, daemon.status())
+        elif path == "/rollouts":
+            self._reply(200, {"rollouts": daemon.list_rollouts()})
+        elif path.startswith("/rollouts/"):
+            rollout = daemon.get_rollout(path.rsplit("/", 1)[-1])
+            self._reply(200, rollout) if rollout else self._reply(404, {"detail": "No such rollout"})
+        elif path == "/metrics":
+            self._reply(200, daemon.runner.spans.prometheus_text(), "text/plain; version=0.0.4")
+        else:
+            self._reply(404, {"detail": f"No route for GET {path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not self._authorized():
+            # Drain the body so the connection can be reused
+            self.rfile.read(length)
+            return
+        daemon = self.server.daemon
+        path = self.path.split("?", 1)[0].rstrip("/")
+        try:
+            body = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            self._reply(400, {"detail": "Body is not valid JSON"})
+            return
+        try:
+            if path == "/rollouts":
+                rollout = daemon.submit(
+                    function_name=body.get("function_name") or "*",
+                    force=body.get("force", False),
+                    changed_since=body.get("changed_since"),
+                )
+                self._reply(202, rollout)
+            elif path == "/reload":
+                self._reply(200, {"changed": daemon.reload()})
+            else:
+                self._reply(404, {"detail": f"No route for POST {path}"})
+        except RolloutConflict as e:
+            self._reply(409, {"detail": str(e)})
+        except Exception as e:
+            self._reply(500, {"detail": str(e)})
+
+class DaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, daemon, address, token=None):
+        self.daemon = daemon
+        self.token = token
+        super().__init__(address, DaemonHandler)
+
+class UnixDaemonServer(DaemonServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        os.chmod(self.server_address, 0o600)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+def serve(runner, manifest_path, args):
+    daemon = LauncherDaemon(
+        runner,
+        manifest_path,
+        max_rollouts=args.max_rollouts,
+        watch_interval=args.watch_interval,
+        deploy_on_change=args.deploy_on_change,
+    )
+    daemon.warm_up()
+    token = os.getenv("NVCF_DAEMON_TOKEN") or None
+    if args.serve.startswith("unix:"):
+        server = UnixDaemonServer(daemon, args.serve[len("unix:"):], token)
+    else:
+        host, _, port = args.serve.rpartition(":")
+        server = DaemonServer(daemon, (host or "127.0.0.1", int(port)), token)
+    threading.Thread(target=daemon.watch, name="nvcf-watch", daemon=True).start()
+    # SIGTERM (e.g. from a service manager) stops the server like Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    logger.info(f"Daemon: Listening on {args.serve}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
+        server.server_close()
+
+def daemon_request(address, method, path, body=None, timeout=30):
+    # Thin client for the daemon API, over TCP (host:port or http://host:port) or unix:/path
+    if address.startswith("unix:"):
+        connection = UnixHTTPConnection(address[len("unix:"):], timeout=timeout)
+    else:
+        parts = urlsplit(address if "://" in address else f"http://{address}")
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        if os.getenv("NVCF_DAEMON_TOKEN"):
+            headers["Authorization"] = f"Bearer {os.getenv('NVCF_DAEMON_TOKEN')}"
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+
+def daemon_call(address, method, path, body=None):
+    # daemon_request for the CLI: an unreachable daemon is reported, not a traceback
+    try:
+        return daemon_request(address, method, path, body)
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        logger.error(f"Daemon at {address} is not reachable: {e}")
+        sys.exit(1)
+
+def detail(reply):
+    return reply.get("detail", "") if isinstance(reply, dict) else ""
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def submit_to_daemon(args):
+    # Hands the rollout to a running daemon; with --wait, follows it to the end
+    body = {"function_name": args.function_name or "*", "force": args.force, "changed_since": args.changed_since}
+    status, rollout = daemon_call(args.daemon, "POST", "/rollouts", body)
+    if status != 202:
+        logger.error(f"Daemon refused the rollout ({status}): {detail(rollout)}")
         sys.exit(1)
+    print(json.dumps({"id": rollout["id"], "functions": rollout["functions"]}))
+    if not args.wait:
+        return
+    rollout_id = rollout["id"]
+    while rollout["state"] in ("queued", "running"):
+        time.sleep(args.wait_interval)
+        status, rollout = daemon_call(args.daemon, "GET", f"/rollouts/{rollout_id}")
+        if status != 200:
+            logger.error(f"Could not get rollout {rollout_id} from the daemon ({status}): {detail(rollout)}")
+            sys.exit(1)
+    for name in rollout["skipped"]:
+        logger.info(f"{name}: unchanged, not redeployed")
+    for failure in rollout["failures"]:
+        logger.error(f"{failure['function']} ({failure['op']}) failed: {failure['error']}")
+    logger.info(f"Rollout {rollout['id']} {rollout['state']}")
+    if rollout["state"] != "succeeded":
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,488 @@
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger("mock-nvcf")
+
+# Route patterns for the endpoints behind BaseClass.SCOPE_API_MAP (all under /v2/nvcf)
+ROUTES = [
+    ("GET", re.compile(r"^/v2/nvcf/functions$"), "list_functions"),
+    ("POST", re.compile(r"^/v2/nvcf/functions$"), "register_function"),
+    ("GET", re.compile(r"^/v2/nvcf/functions/(?P<fn_id>[^/]+)/versions$"), "list_versions"),
+    ("POST", re.compile(r"^/v2/nvcf/functions/(?P<fn_id>[^/]+)/versions$"), "register_version"),
+    ("DELETE", re.compile(r"^/v2/nvcf/functions/(?P<fn_id>[^/]+)/versions/(?P<version_id>[^/]+)$"), "delete_version"),
+    (
+        "POST",
+        re.compile(r"^/v2/nvcf/deployments/functions/(?P<fn_id>[^/]+)/versions/(?P<version_id>[^/]+)$"),
+        "deploy",
+    ),
+    (
+        "GET",
+        re.compile(r"^/v2/nvcf/deployments/functions/(?P<fn_id>[^/]+)/versions/(?P<version_id>[^/]+)$"),
+        "deployment_status",
+    ),
+    (
+        "DELETE",
+        re.compile(r"^/v2/nvcf/deployments/functions/(?P<fn_id>[^/]+)/versions/(?P<version_id>[^/]+)$"),
+        "undeploy",
+    ),
+    ("POST", re.compile(r"^/v2/nvcf/pexec/functions/(?P<fn_id>[^/]+)/versions/(?P<version_id>[^/]+)$"), "invoke"),
+    ("GET", re.compile(r"^/v2/nvcf/queues/functions/(?P<fn_id>[^/]+)/versions/(?P<version_id>[^/]+)$"), "queue_details"),
+    ("GET", re.compile(r"^/v2/nvcf/clusterGroups$"), "cluster_groups"),
+    ("HEAD", re.compile(r"^/v2/(?P<repository>.+)/manifests/(?P<reference>[^/]+)$"), "image_manifest"),
+    ("GET", re.compile(r"^/proxy_auth$"), "registry_token"),
+    (
+        "GET",
+        re.compile(
+            r"^/v2/org/(?P<org>[^/]+)(?:/team/(?P<team>[^/]+))?/models/(?P<model>[^/]+)/versions/(?P<version>[^/]+)$"
+        ),
+        "model_version",
+    ),
+    ("GET", re.compile(r"^/_mock/stats$"), "stats"),
+]
+
+
+# Offered to every org unless the mock is given its own cluster groups
+DEFAULT_CLUSTER_GROUPS = [
+    {
+        "id": "mock-gfn",
+        "name": "GFN",
+        "gpus": [
+            {"name": "L40S", "instanceTypes": [{"name": "gl40s_1.br25_2xlarge", "default": True}]},
+            {"name": "L40", "instanceTypes": [{"name": "gl40_1.br20_2xlarge", "default": True}]},
+        ],
+    },
+    {
+        "id": "mock-dgxc",
+        "name": "DGXC",
+        "gpus": [{"name": "H100", "instanceTypes": [{"name": "DGX-CLOUD.GPU.H100_1x", "default": True}]}],
+    },
+]
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class MockNVCF:
+    # In-memory NVCF state with configurable latency, deploy durations,
+    # deployment failure rate, throttling rate and org size
+    def __init__(
+        self,
+        latency=0.0,
+        deploy_duration=(5.0, 10.0),
+        error_rate=0.0,
+        throttle_rate=0.0,
+        retry_after=0.1,
+        invoke_latency=(0.05, 0.2),
+        invoke_error_rate=0.0,
+        cold_start=0.0,
+        cluster_groups=None,
+        missing_images=(),
+        missing_models=(),
+        seed=None,
+    ):
+        self.latency = latency
+        self.deploy_duration = deploy_duration
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.invoke_latency = invoke_latency
+        self.invoke_error_rate = invoke_error_rate
+        # Seconds after becoming ACTIVE that a deployed version answers 503 while it loads
+        self.cold_start = cold_start
+        self.cluster_groups = DEFAULT_CLUSTER_GROUPS if cluster_groups is None else cluster_groups
+        # Every image and model version exists except these ("repository:tag", "model:version")
+        self.missing_images = set(missing_images)
+        self.missing_models = set(missing_models)
+        self.random = random.Random(seed)
+        self.functions = {}
+        self.deployments = {}
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def seed_org(self, functions=0, versions=1, prefix="org-fn", status="ACTIVE", spec=None):
+        # Pre-populate the org with functions x versions records; with a deploy
+        # spec they are treated as deployed (e.g. to receive synthetic traffic)
+        with self._lock:
+            for i in range(functions):
+                fn_id = str(uuid.uuid4())
+                for _ in range(versions):
+                    record = self._add_version(fn_id, f"{prefix}-{i}", status=status)
+                    if spec is not None:
+                        self.deployments[record["versionId"]] = {
+                            "started": time.monotonic(),
+                            "duration": 0.0,
+                            "outcome": status,
+                            "spec": spec,
+                            "warm": True,
+                        }
+
+    def _add_version(self, fn_id, name, status="INACTIVE", payload=None):
+        record = {
+            "id": fn_id,
+            "versionId": str(uuid.uuid4()),
+            "name": name,
+            "status": status,
+            "createdAt": _now(),
+            "ncaId": "mock-nca-id",
+            "inferenceUrl": "/v1/chat/completions",
+            "apiBodyFormat": "CUSTOM",
+        }
+        for key in ("inferenceUrl", "inferencePort", "healthUri", "containerImage", "apiBodyFormat", "tags"):
+            if payload and key in payload:
+                record[key] = payload[key]
+        self.functions[record["versionId"]] = record
+        return record
+
+    def _status(self, version_id):
+        # Deployments move to ACTIVE (or ERROR) once their duration has elapsed
+        record = self.functions.get(version_id)
+        deployment = self.deployments.get(version_id)
+        if record is None:
+            return None
+        if deployment is not None and record["status"] == "DEPLOYING":
+            if time.monotonic() - deployment["started"] >= deployment["duration"]:
+                record["status"] = deployment["outcome"]
+        return record["status"]
+
+    def start_traffic(self, concurrency):
+        # Keeps concurrency synthetic callers busy against every ACTIVE version,
+        # so queue depth and latency look like a function serving real traffic
+        def caller(version_id):
+            while True:
+                with self._lock:
+                    record = self.functions.get(version_id)
+                    serve = self._invoke(None, None, record["id"], version_id) if record else None
+                if not callable(serve):
+                    return
+                serve()
+
+        def manager():
+            started = set()
+            while True:
+                with self._lock:
+                    active = [v for v in list(self.deployments) if self._status(v) == "ACTIVE" and v not in started]
+                for version_id in active:
+                    started.add(version_id)
+                    for _ in range(concurrency):
+                        threading.Thread(target=caller, args=(version_id,), daemon=True).start()
+                time.sleep(0.2)
+
+        if concurrency:
+            threading.Thread(target=manager, name="mock-nvcf-traffic", daemon=True).start()
+
+    def handle(self, method, path, query, body, headers=None):
+        # Returns (status, payload, headers). Handlers may return a callable
+        # instead, which runs outside the state lock (e.g. a slow invocation)
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return 404, {"detail": f"No route for {method} {path}"}, {}
+
+        with self._lock:
+            self.requests[name] += 1
+            self.requests["total"] += 1
+            if name != "stats" and self.throttle_rate and self.random.random() < self.throttle_rate:
+                self.requests["throttled"] += 1
+                return 429, {"detail": "Too Many Requests"}, {"Retry-After": str(self.retry_after)}
+            if name == "image_manifest" and not (headers or {}).get("Authorization", "").startswith("Bearer "):
+                # Like nvcr.io, the registry answers with a token challenge first
+                self.requests["registry_challenge"] += 1
+                realm = f"http://{(headers or {}).get('Host', '127.0.0.1')}/proxy_auth"
+                scope = f"repository:{match['repository']}:pull"
+                return 401, None, {"WWW-Authenticate": f'Bearer realm="{realm}",service="registry",scope="{scope}"'}
+            result = getattr(self, f"_{name}")(query=query, body=body, **match.groupdict())
+        return result() if callable(result) else result
+
+    def _stats(self, query, body):
+        return 200, dict(self.requests), {}
+
+    def _list_functions(self, query, body):
+        for version_id in list(self.deployments):
+            self._status(version_id)
+        return 200, {"functions": list(self.functions.values())}, {}
+
+    def _list_versions(self, query, body, fn_id):
+        return 200, {"functions": [f for f in self.functions.values() if f["id"] == fn_id]}, {}
+
+    def _register_function(self, query, body):
+        record = self._add_version(str(uuid.uuid4()), body.get("name"), payload=body)
+        return 200, {"function": dict(record)}, {}
+
+    def _register_version(self, query, body, fn_id):
+        if not any(f["id"] == fn_id for f in self.functions.values()):
+            return 404, {"detail": f"Function {fn_id} not found"}, {}
+        record = self._add_version(fn_id, body.get("name"), payload=body)
+        return 200, {"function": dict(record)}, {}
+
+    def _delete_version(self, query, body, fn_id, version_id):
+        record = self.functions.get(version_id)
+        if record is None or record["id"] != fn_id:
+            return 404, {"detail": f"Version {version_id} not found"}, {}
+        del self.functions[version_id]
+        self.deployments.pop(version_id, None)
+        return 204, None, {}
+
+    def _deploy(self, query, body, fn_id, version_id):
+        record = self.functions.get(version_id)
+        if record is None:
+            return 404, {"detail": f"Version {version_id} not found"}, {}
+
+        # A spec for a pool the org does not have never leaves DEPLOYING, like a
+        # deployment waiting for capacity that will not come
+        low, high = self.deploy_duration
+        schedulable = all(self._schedulable(spec) for spec in (body or {}).get("deploymentSpecifications") or [])
+        self.deployments[version_id] = {
+            "started": time.monotonic(),
+            "duration": self.random.uniform(low, high) if schedulable else float("inf"),
+            "outcome": "ERROR" if self.random.random() < self.error_rate else "ACTIVE",
+            "spec": body,
+        }
+        record["status"] = "DEPLOYING"
+        return 200, {"deployment": {"functionId": fn_id, "functionVersionId": version_id, "functionStatus": "DEPLOYING"}}, {}
+
+    def _schedulable(self, spec):
+        for group in self.cluster_groups:
+            if group["name"] != spec.get("backend"):
+                continue
+            for gpu in group.get("gpus", []):
+                if gpu["name"] == spec.get("gpu"):
+                    return any(t["name"] == spec.get("instanceType") for t in gpu.get("instanceTypes", []))
+        return False
+
+    def _cluster_groups(self, query, body):
+        return 200, {"clusterGroups": self.cluster_groups}, {}
+
+    def _image_manifest(self, query, body, repository, reference):
+        if f"{repository}:{reference}" in self.missing_images:
+            return 404, None, {}
+        return 200, None, {"Docker-Content-Digest": f"sha256:{uuid.uuid5(uuid.NAMESPACE_URL, repository).hex}"}
+
+    def _registry_token(self, query, body):
+        return 200, {"token": "mock-registry-token"}, {}
+
+    def _model_version(self, query, body, org, team, model, version):
+        if f"{model}:{version}" in self.missing_models:
+            return 404, {"requestStatus": {"statusCode": "NOT_FOUND"}}, {}
+        return 200, {"modelVersion": {"versionId": version, "status": "UPLOAD_COMPLETE"}}, {}
+
+    def _undeploy(self, query, body, fn_id, version_id):
+        record = self.functions.get(version_id)
+        if record is None or record["id"] != fn_id:
+            return 404, {"detail": f"Version {version_id} not found"}, {}
+        self.deployments.pop(version_id, None)
+        record["status"] = "INACTIVE"
+        return 204, None, {}
+
+    def _invoke(self, query, body, fn_id, version_id):
+        # Each deployed instance serves maxRequestConcurrency requests at a
+        # time, the rest wait in the version's queue
+        if self._status(version_id) != "ACTIVE":
+            return 404, {"detail": f"Version {version_id} is not ACTIVE"}, {}
+        # Seeded versions are ACTIVE without having been deployed through the mock
+        deployment = self.deployments.setdefault(
+            version_id, {"started": time.monotonic(), "duration": 0.0, "outcome": "ACTIVE", "spec": None, "warm": True}
+        )
+        if not deployment.get("warm"):
+            if time.monotonic() < deployment["started"] + deployment["duration"] + self.cold_start:
+                self.requests["cold_invoke"] += 1
+                return 503, {"detail": "Instances are still loading"}, {}
+            deployment["warm"] = True
+        if "slots" not in deployment:
+            spec = ((deployment.get("spec") or {}).get("deploymentSpecifications") or [{}])[0]
+            capacity = max(1, (spec.get("maxInstances") or 1) * (spec.get("maxRequestConcurrency") or 1))
+            deployment.update(capacity=capacity, slots=threading.Semaphore(capacity), inflight=0)
+        deployment["inflight"] += 1
+        low, high = self.invoke_latency
+        service_time = self.random.uniform(low, high)
+        failed = self.random.random() < self.invoke_error_rate
+
+        def serve():
+            try:
+                with deployment["slots"]:
+                    time.sleep(service_time)
+            finally:
+                with self._lock:
+                    deployment["inflight"] -= 1
+            if failed:
+                return 500, {"detail": "Inference failed"}, {}
+            return 200, {"id": str(uuid.uuid4()), "choices": [{"message": {"role": "assistant", "content": "Hello."}}]}, {}
+
+        return serve
+
+    def _queue_details(self, query, body, fn_id, version_id):
+        record = self.functions.get(version_id)
+        if record is None:
+            return 404, {"detail": f"Version {version_id} not found"}, {}
+        deployment = self.deployments.get(version_id, {})
+        depth = max(0, deployment.get("inflight", 0) - deployment.get("capacity", 1))
+        return 200, {
+            "functionId": fn_id,
+            "queues": [
+                {
+                    "functionVersionId": version_id,
+                    "functionName": record["name"],
+                    "functionStatus": self._status(version_id),
+                    "queueDepth": depth,
+                }
+            ],
+        }, {}
+
+    def _deployment_status(self, query, body, fn_id, version_id):
+        status = self._status(version_id)
+        if status is None:
+            return 404, {"detail": f"Version {version_id} not found"}, {}
+        deployment = self.deployments.get(version_id, {})
+        return 200, {
+            "deployment": {
+                "functionId": fn_id,
+                "functionVersionId": version_id,
+                "functionStatus": status,
+                "deploymentSpecifications": (deployment.get("spec") or {}).get("deploymentSpecifications", []),
+            }
+        }, {}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _dispatch(self, method):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = None
+
+        mock = self.server.mock
+        if mock.latency:
+            time.sleep(mock.latency)
+        status, payload, headers = mock.handle(method, parts.path, parse_qs(parts.query), body, self.headers)
+
+        data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, mock, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockHandler)
+        self.mock = mock
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="mock-nvcf", daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the NVCF/NGC APIs")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument(
+        "--deploy-duration", type=float, nargs=2, default=(5.0, 10.0), metavar=("MIN", "MAX"),
+        help="Seconds a deployment takes to leave DEPLOYING",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of deployments that end in ERROR")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument(
+        "--invoke-latency", type=float, nargs=2, default=(0.05, 0.2), metavar=("MIN", "MAX"),
+        help="Seconds an invocation occupies an instance slot",
+    )
+    parser.add_argument("--traffic", type=int, default=0, help="Synthetic callers kept busy per ACTIVE version")
+    parser.add_argument("--invoke-error-rate", type=float, default=0.0, help="Fraction of invocations failing with 500")
+    parser.add_argument(
+        "--cold-start", type=float, default=0.0, help="Seconds a newly ACTIVE version answers 503 while it loads"
+    )
+    parser.add_argument("--org-size", type=int, default=0, help="Unrelated functions to pre-populate the org with")
+    parser.add_argument("--org-versions", type=int, default=1, help="Versions per pre-populated function")
+    parser.add_argument(
+        "--cluster-groups", type=str, default=None, help="JSON file with the clusterGroups to offer (default: GFN and DGXC)"
+    )
+    parser.add_argument(
+        "--missing-image", action="append", default=[], metavar="REPOSITORY:TAG",
+        help="Registry image to report as not found, e.g. org/team/app:v2 (repeatable)",
+    )
+    parser.add_argument(
+        "--missing-model", action="append", default=[], metavar="MODEL:VERSION",
+        help="NGC model version to report as not found (repeatable)",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    cluster_groups = None
+    if args.cluster_groups:
+        with open(args.cluster_groups) as file:
+            cluster_groups = json.load(file)
+        if isinstance(cluster_groups, dict):
+            cluster_groups = cluster_groups.get("clusterGroups", [])
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    mock = MockNVCF(
+        latency=args.latency,
+        deploy_duration=tuple(args.deploy_duration),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        invoke_latency=tuple(args.invoke_latency),
+        invoke_error_rate=args.invoke_error_rate,
+        cold_start=args.cold_start,
+        cluster_groups=cluster_groups,
+        missing_images=args.missing_image,
+        missing_models=args.missing_model,
+        seed=args.seed,
+    )
+    mock.seed_org(args.org_size, args.org_versions)
+    mock.start_traffic(args.traffic)
+    server = MockServer(mock, args.host, args.port)
+    logger.info(f"Mock NVCF API listening on {server.url} (set NVCF_API_BASE={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from common import BaseClass, LoadProbe, load_yaml, log_context, percentile
+from yaml_edit import update_yaml_file
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("nvcf")
+
+# Sent with each latency sample when --payload is not given
+PROBE_PAYLOAD = {"messages": [{"role": "user", "content": "Say hello."}], "max_tokens": 16}
+
+
+def recommend(inst_min, inst_max, concurrency, queue_depths, latencies, target_latency_ms=None, headroom=1.2):
+    # Sizing model:
+    # - a queue means every slot (instance x concurrency) is busy, so demand is
+    #   the current slots plus one per request waiting at p95, with headroom
+    # - requests sharing an instance slow each other down roughly linearly, so
+    #   per-instance concurrency scales with target / observed p95 latency
+    #   (at most doubling per run, so a change can be checked before the next)
+    slots = inst_max * concurrency
+    queue_p95 = percentile(sorted(queue_depths), 95) or 0
+    latency_p95 = percentile(sorted(latencies), 95)
+    reasons = []
+
+    new_concurrency = concurrency
+    if target_latency_ms and latency_p95:
+        latency_ms = latency_p95 * 1000
+        new_concurrency = max(1, min(2 * concurrency, math.floor(concurrency * target_latency_ms / latency_ms)))
+        if latency_ms > target_latency_ms:
+            reasons.append(f"p95 {latency_ms:.0f}ms is over the {target_latency_ms:g}ms target")
+        elif new_concurrency > concurrency:
+            reasons.append(f"p95 {latency_ms:.0f}ms leaves headroom under the {target_latency_ms:g}ms target")
+
+    if queue_p95 > 0:
+        demand = (slots + queue_p95) * headroom
+        reasons.append(f"{queue_p95} request(s) queued at p95")
+    else:
+        demand = slots
+
+    new_max = max(1, math.ceil(demand / new_concurrency))
+    new_min = min(max(1, inst_min), new_max)
+    if not reasons:
+        reasons.append("no queueing and latency within target")
+    return {
+        "inst_min": new_min,
+        "inst_max": new_max,
+        "inst_max_request_concurrency": new_concurrency,
+        "reason": "; ".join(reasons),
+    }
+
+
+@dataclass
+class SizingAdvisor(BaseClass):
+    job_name: str
+    environment: str = "production"
+    window: float = 300.0
+    interval: float = 5.0
+    target_latency_ms: float = None
+    headroom: float = 1.2
+    latency_samples: bool = True
+    payload: dict = None
+    # Functions sampled at a time, like the launcher's --max-parallel
+    parallel: int = 1
+
+    def __post_init__(self):
+        super().__init__()
+        self.load_environment_variables()
+
+    def deployed_version(self, fn_name):
+        # Latest ACTIVE version of a launch list entry in this environment
+        prefix = "qa" if self.environment == "test" else "ai"
+        return self.inventory.latest(f"{prefix}-{fn_name}", fn_name, statuses={"ACTIVE"})
+
+    def sample(self, fn_name):
+        # Queue depth (and one timed invocation) every interval for the window
+        log_context.name = fn_name
+        try:
+            record = self.deployed_version(fn_name)
+            if record is None:
+                logger.warning(f"{self.job_name}: No ACTIVE version found, skipping")
+                return None
+            probe = LoadProbe(
+                self.client,
+                self.SCOPE_API_MAP["invoke_function"],
+                self.SCOPE_API_MAP["queue_details"],
+                record.id,
+                record.versionId,
+            )
+            queue_depths, latencies, errors = [], [], 0
+            deadline = time.monotonic() + self.window
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                depth = probe.queue_depth()
+                if depth is not None:
+                    queue_depths.append(depth)
+                if self.latency_samples:
+                    latency, error = probe.invoke(self.payload or PROBE_PAYLOAD, timeout=max(self.interval, 60.0))
+                    if error is None:
+                        latencies.append(latency)
+                    else:
+                        errors += 1
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+            logger.info(
+                f"{self.job_name}: {len(queue_depths)} queue sample(s), {len(latencies)} latency sample(s),"
+                f" {errors} failed invocation(s) for {record.versionId}"
+            )
+            return {"version_id": record.versionId, "queue_depths": queue_depths, "latencies": latencies}
+        finally:
+            log_context.name = None
+
+    def advise(self, entries):
+        self.inventory_names = {entry["fn_name"] for entry in entries}
+        self._list_nvcf_fn(logger=logger)
+        workers = max(1, min(self.parallel, len(entries)))
+        logger.info(
+            f"{self.job_name}: Sampling {len(entries)} function(s) for {self.window:g}s each, {workers} at a time"
+        )
+        with (
+            self.client.reserve(self.SCOPE_API_MAP["invoke_function"], workers),
+            self.client.reserve(self.SCOPE_API_MAP["queue_details"], workers),
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nvcf-size") as executor,
+        ):
+            samples = list(executor.map(lambda entry: self.sample(entry["fn_name"]), entries))
+
+        advice = []
+        for entry, sampled in zip(entries, samples):
+            if sampled is None:
+                continue
+            # A probe SLO in the launch list doubles as the sizing target
+            target = self.target_latency_ms or (entry.get("probe") or {}).get("slo_p95_ms")
+            current = {
+                "inst_min": int(entry.get("inst_min", 1)),
+                "inst_max": int(entry.get("inst_max", 1)),
+                "inst_max_request_concurrency": int(entry.get("inst_max_request_concurrency", 1)),
+            }
+            recommended = recommend(
+                current["inst_min"],
+                current["inst_max"],
+                current["inst_max_request_concurrency"],
+                sampled["queue_depths"],
+                sampled["latencies"],
+                target_latency_ms=target,
+                headroom=self.headroom,
+            )
+            latency_p95 = percentile(sorted(sampled["latencies"]), 95)
+            advice.append(
+                {
+                    "fn_name": entry["fn_name"],
+                    "version_id": sampled["version_id"],
+                    "queue_depth_p95": percentile(sorted(sampled["queue_depths"]), 95),
+                    "queue_depth_max": max(sampled["queue_depths"], default=None),
+                    "latency_p95_ms": round(latency_p95 * 1000, 1) if latency_p95 else None,
+                    "target_latency_ms": target,
+                    "current": current,
+                    "recommended": recommended,
+                }
+            )
+        return advice
+
+
+def print_advice(advice):
+    print(f"{'function':<28}{'queue p95':>10}{'p95 ms':>9}  {'min/max/conc now':<18}{'recommended':<14}reason")
+    for item in advice:
+        now = item["current"]
+        new = item["recommended"]
+        latency = f"{item['latency_p95_ms']:.0f}" if item["latency_p95_ms"] else "-"
+        print(
+            f"{item['fn_name']:<28}{item['queue_depth_p95'] if item['queue_depth_p95'] is not None else '-':>10}"
+            f"{latency:>9}  {now['inst_min']}/{now['inst_max']}/{now['inst_max_request_concurrency']:<14}"
+            f"{new['inst_min']}/{new['inst_max']}/{new['inst_max_request_concurrency']:<10}{new['reason']}"
+        )
+
+
+def write_back(path, launch_list, advice):
+    # Edited in place like update-launch-list.py, so only the changed values show in the diff
+    by_name = {item["fn_name"]: item["recommended"] for item in advice}
+    updates = {}
+    for i, entry in enumerate(launch_list.get("functions", [])):
+        recommended = by_name.get(entry.get("fn_name"))
+        if recommended is None:
+            continue
+        for key in ("inst_min", "inst_max", "inst_max_request_concurrency"):
+            if entry.get(key) != recommended[key]:
+                updates[("functions", i, key)] = recommended[key]
+    if updates:
+        update_yaml_file(path, updates)
+    return len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend instance counts and concurrency from queue depth")
+    parser.add_argument("--launch-list", type=str, default="launch-list.yml", help="Launch list to read and update")
+    parser.add_argument("--function-name", type=str, default="*", help="Comma-separated fn_name(s) or '*'")
+    parser.add_argument("--environment", type=str, default="production", help="Environment the functions run in")
+    parser.add_argument("--window", type=float, default=300.0, help="Seconds to sample each function for")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between samples")
+    parser.add_argument(
+        "--target-latency-ms", type=float, default=None,
+        help="p95 latency target (default: each function's probe.slo_p95_ms, if set)",
+    )
+    parser.add_argument("--headroom", type=float, default=1.2, help="Capacity factor applied to queued demand")
+    parser.add_argument(
+        "--parallel", type=int, default=1, help="Functions to sample at the same time (default 1, like --max-parallel)"
+    )
+    parser.add_argument(
+        "--no-latency", action="store_true", help="Only sample queue depth, do not send timed invocations"
+    )
+    parser.add_argument("--payload", type=json.loads, default=None, help="JSON body for the timed invocations")
+    parser.add_argument("--json", type=str, help="Also write the recommendations to this JSON file")
+    parser.add_argument("--write", action="store_true", help="Write the recommendations back to the launch list")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.launch_list):
+        print(f"Error: {args.launch_list} not found")
+        sys.exit(1)
+    with open(args.launch_list) as file:
+        launch_list = load_yaml(file)
+
+    names = {name.strip() for name in args.function_name.split(",")}
+    entries = [
+        entry for entry in launch_list.get("functions", [])
+        if entry.get("fn_name") and ("*" in names or entry["fn_name"] in names)
+    ]
+    if not entries:
+        print("Error: no matching functions in the launch list")
+        sys.exit(1)
+
+    advisor = SizingAdvisor(
+        job_name="Sizing",
+        environment=args.environment,
+        window=args.window,
+        interval=args.interval,
+        target_latency_ms=args.target_latency_ms,
+        headroom=args.headroom,
+        latency_samples=not args.no_latency,
+        payload=args.payload,
+        parallel=args.parallel,
+    )
+    advice = advisor.advise(entries)
+    print_advice(advice)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(advice, file, indent=2)
+    if args.write:
+        changed = write_back(args.launch_list, launch_list, advice)
+        print(f"Updated {changed} value(s) in {args.launch_list}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_script(name):
+    # The scripts have hyphenated names, so they are loaded by path
+    module_name = name.replace("-", "_")
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[module_name]
+
+
+@pytest.fixture
+def tmp_yaml(tmp_path):
+    def write(text, name="launch-list.yml"):
+        path = tmp_path / name
+        path.write_text(text)
+        return path
+    return write
+
+
+@pytest.fixture
+def mock_api():
+    # An in-process mock NVCF API; call it with MockNVCF options to start one
+    mock_nvcf = load_script("mock-nvcf")
+    servers = []
+
+    def start(**options):
+        options.setdefault("deploy_duration", (0.2, 0.4))
+        options.setdefault("seed", 0)
+        server = mock_nvcf.MockServer(mock_nvcf.MockNVCF(**options)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
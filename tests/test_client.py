@@ -0,0 +1,52 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from common import NVCFClient
+
+
+def client(**kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return NVCFClient(lambda: "key", **kwargs)
+
+
+def test_retries_throttled_requests(mock_api):
+    server = mock_api(throttle_rate=0.5, retry_after=0.01, seed=1)
+    http = client(max_retries=10)
+    for _ in range(10):
+        response = http.post(f"{server.url}/v2/nvcf/functions", json={"name": "a"})
+        assert response.status_code == 200
+    assert server.mock.requests["throttled"] > 0
+    assert server.mock.requests["register_function"] == 10 + server.mock.requests["throttled"]
+
+
+def test_gives_up_after_max_retries(mock_api):
+    server = mock_api(throttle_rate=1.0, retry_after=0.01)
+    response = client(max_retries=2).get(f"{server.url}/v2/nvcf/functions")
+    assert response.status_code == 429
+    assert response.retries == 2
+
+
+def test_reauthenticates_once_on_401(mock_api):
+    server = mock_api()
+    calls = []
+    http = client(on_unauthorized=lambda: calls.append(1))
+    # The registry answers 401 until a bearer token is sent
+    url = f"{server.url}/v2/org/app/manifests/v1"
+    assert http.head(url, headers={"Authorization": None}).status_code == 401
+    assert calls == [1]
+    assert http.head(url, headers={"Authorization": None}, reauth=False).status_code == 401
+    assert calls == [1]
+
+
+def test_reserve_grows_the_pool(mock_api, caplog):
+    server = mock_api(invoke_latency=(0.05, 0.05))
+    http = client(pool_size=2)
+    url = f"{server.url}/v2/nvcf/clusterGroups"
+    http.get(url)
+    with caplog.at_level(logging.WARNING, logger="urllib3.connectionpool"):
+        with http.reserve(url, 8):
+            assert http._pool_sizes[server.url] == 10
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                assert all(r.ok for r in executor.map(lambda _: http.get(url), range(40)))
+    assert "Connection pool is full" not in caplog.text
+    assert http._reserved[server.url] == 0
@@ -0,0 +1,216 @@
+import json
+
+import pytest
+
+from common import (
+    ClusterCapacity,
+    DeploymentHistory,
+    DeploymentJournal,
+    FunctionInventory,
+    Placement,
+    iter_json_array,
+    spec_fingerprint,
+)
+
+
+def chunked(document, size):
+    data = json.dumps(document).encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 100000])
+def test_iter_json_array_any_chunk_size(size):
+    functions = [{"name": f"fn-{i}", "tags": ["a", "ü"], "nested": {"n": i}} for i in range(20)]
+    document = {"meta": {"functions": "not this one"}, "functions": functions, "after": [1, 2]}
+    assert list(iter_json_array(chunked(document, size), "functions")) == functions
+
+
+def test_iter_json_array_missing_or_empty():
+    assert list(iter_json_array(chunked({"other": [{}]}, 5), "functions")) == []
+    assert list(iter_json_array(chunked({"functions": []}, 5), "functions")) == []
+
+
+def test_iter_json_array_truncated():
+    data = json.dumps({"functions": [{"name": "a"}, {"name": "b"}]}).encode("utf-8")
+    items = iter_json_array([data[:-8]], "functions")
+    assert next(items) == {"name": "a"}
+    with pytest.raises(ValueError):
+        list(items)
+
+
+def test_spec_fingerprint_ignores_key_order():
+    a = spec_fingerprint({"name": "fn", "spec": {"gpu": "L40S", "min": 1}}, {"models": []})
+    b = spec_fingerprint({"spec": {"min": 1, "gpu": "L40S"}, "name": "fn"}, {"models": []})
+    assert a == b
+    assert a != spec_fingerprint({"name": "fn", "spec": {"gpu": "L40S", "min": 2}}, {"models": []})
+    assert a != spec_fingerprint({"models": []}, {"name": "fn", "spec": {"gpu": "L40S", "min": 1}})
+
+
+def record(version_id, name="ai-app", status="ACTIVE"):
+    return {"id": f"id-{name}", "versionId": version_id, "name": name, "status": status}
+
+
+def test_inventory_orders_by_version_id():
+    inventory = FunctionInventory()
+    inventory.load([record("v3"), record("v1", status="INACTIVE"), record("v2", name="qa-app")])
+    assert [r.versionId for r in inventory.lookup("ai-app")] == ["v1", "v3"]
+    assert [r.versionId for r in inventory.lookup("ai-app", "qa-app")] == ["v1", "v2", "v3"]
+    assert [r.versionId for r in inventory.family("app")] == ["v1", "v2", "v3"]
+    assert inventory.latest("ai-app").versionId == "v3"
+    assert inventory.latest("ai-app", statuses={"INACTIVE"}).versionId == "v1"
+    assert inventory.latest("missing") is None
+
+
+def test_inventory_updates_in_place():
+    inventory = FunctionInventory()
+    inventory.load([record("v1"), record("v3")])
+    inventory.upsert(record("v2", status="DEPLOYING"))
+    assert [r.versionId for r in inventory.lookup("ai-app")] == ["v1", "v2", "v3"]
+    assert [r.versionId for r in inventory.by_status("DEPLOYING")] == ["v2"]
+
+    inventory.set_status("v2", "ACTIVE")
+    assert inventory.by_status("DEPLOYING") == []
+    assert {r.versionId for r in inventory.by_status("ACTIVE")} == {"v1", "v2", "v3"}
+
+    assert inventory.remove("v3").versionId == "v3"
+    assert inventory.latest("ai-app").versionId == "v2"
+    assert inventory.remove("v3") is None
+    assert inventory.set_status("v3", "ACTIVE") is None
+    assert len(inventory) == 2
+
+
+def test_inventory_base_name():
+    assert FunctionInventory.base_name("ai-app") == "app"
+    assert FunctionInventory.base_name("qa-app") == "app"
+    assert FunctionInventory.base_name("app") == "app"
+
+
+def test_inventory_fetches_once_until_stale():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return [record("v1")]
+
+    inventory = FunctionInventory()
+    inventory.ensure_fresh(fetch)
+    inventory.ensure_fresh(fetch)
+    assert len(calls) == 1
+    inventory.invalidate()
+    inventory.ensure_fresh(fetch)
+    assert len(calls) == 2
+
+    expired = FunctionInventory(ttl=0)
+    expired.ensure_fresh(fetch)
+    expired.fetched_at -= 1
+    expired.ensure_fresh(fetch)
+    assert len(calls) == 4
+
+
+def test_journal_replays_latest_step(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = DeploymentJournal(str(path))
+    journal.record("ai-app", "registered", version_id="v1", fingerprint="f1")
+    journal.record("ai-app", "deploying")
+    journal.record("ai-other", "registered", version_id="v9")
+    # A new attempt drops the fields of the previous one
+    journal.record("ai-other", "registered", version_id="v10")
+    with open(path, "a") as file:
+        file.write('{"function": "ai-app", "step": "act')
+
+    replayed = DeploymentJournal(str(path))
+    assert replayed.get("ai-app")["step"] == "deploying"
+    assert replayed.get("ai-app")["version_id"] == "v1"
+    assert replayed.get("ai-app")["fingerprint"] == "f1"
+    assert replayed.get("ai-other")["version_id"] == "v10"
+    # Later steps keep the time the attempt was registered
+    assert replayed.get("ai-app")["registered_at"] <= replayed.get("ai-app")["time"]
+    assert replayed.get("missing") is None
+
+
+def test_journal_compacts(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = DeploymentJournal(str(path))
+    for i in range(DeploymentJournal.COMPACT_RATIO + 2):
+        journal.record("ai-app", "registered", version_id=f"v{i}")
+
+    replayed = DeploymentJournal(str(path))
+    assert len(path.read_text().splitlines()) == 1
+    assert replayed.get("ai-app")["version_id"] == f"v{DeploymentJournal.COMPACT_RATIO + 1}"
+
+
+def test_history_estimate_falls_back_to_inst_type(tmp_path):
+    path = tmp_path / "history.jsonl"
+    history = DeploymentHistory(str(path))
+    for duration in (100, 200, 300):
+        history.record("ai-other", "gl40s", "ACTIVE", duration)
+    history.record("ai-other", "gl40s", "ERROR", 5)
+    history.record("ai-app", "gl40s", "ACTIVE", 400)
+
+    estimate = history.estimate("ai-app", "gl40s")
+    assert (estimate.basis, estimate.samples) == ("inst_type", 4)
+    assert history.estimate("ai-new", "a100") is None
+
+    for duration in (10, 20):
+        history.record("ai-app", "gl40s", "ACTIVE", duration)
+    replayed = DeploymentHistory(str(path))
+    estimate = replayed.estimate("ai-app", "gl40s")
+    assert (estimate.basis, estimate.samples) == ("function", 3)
+    assert replayed.durations(function="ai-app") == [10, 20, 400]
+
+
+def test_history_counts_timeouts_at_their_deadline(tmp_path):
+    history = DeploymentHistory(str(tmp_path / "history.jsonl"))
+    for duration in (100, 110, 120):
+        history.record("ai-app", "gl40s", "ACTIVE", duration)
+    history.record("ai-app", "gl40s", "TIMEOUT", 600)
+    history.record("ai-app", "gl40s", "ERROR", 5)
+    assert history.durations(function="ai-app") == [100, 110, 120, 600]
+    assert history.estimate("ai-app", "gl40s").p99 > 590
+
+
+def test_history_keeps_last_deploys(tmp_path, monkeypatch):
+    monkeypatch.setattr(DeploymentHistory, "KEEP", 3)
+    path = tmp_path / "history.jsonl"
+    history = DeploymentHistory(str(path))
+    for duration in range(1, 21):
+        history.record("ai-app", "gl40s", "ACTIVE", duration)
+
+    replayed = DeploymentHistory(str(path))
+    assert replayed.durations(function="ai-app") == [18, 19, 20]
+    assert len(path.read_text().splitlines()) == 3
+
+
+CLUSTER_GROUPS = [
+    {"name": "GFN", "gpus": [
+        {"name": "L40S", "instanceTypes": [{"name": "gl40s_1.br25_2xlarge"}]},
+        {"name": "L40", "instanceTypes": [{"name": "gl40_1.br20_2xlarge"}]},
+    ]},
+    {"name": "dgxc", "gpus": [{"name": "A100", "instanceTypes": [{"name": "ga100_1"}]}]},
+]
+
+
+@pytest.mark.parametrize(
+    "placement, reason",
+    [
+        (("GFN", "L40S", "gl40s_1.br25_2xlarge"), None),
+        (("gfn", "l40s", "gl40s_1.br25_2xlarge"), None),
+        (("DGXC", "A100", "ga100_1"), None),
+        (("OCI", "L40S", "gl40s_1.br25_2xlarge"), "not an available cluster group"),
+        (("GFN", "H100", "gh100_1"), "no H100 GPUs in GFN"),
+        (("GFN", "L40", "gl40s_1.br25_2xlarge"), "is not offered for L40 in GFN"),
+    ],
+)
+def test_cluster_capacity_check(placement, reason):
+    capacity = ClusterCapacity(CLUSTER_GROUPS)
+    backend, gpu, inst_type = placement
+    result = capacity.check(Placement(inst_backend=backend, inst_gpu_type=gpu, inst_type=inst_type))
+    if reason is None:
+        assert result is None
+    else:
+        assert reason in result
+
+
+def test_cluster_capacity_empty():
+    assert len(ClusterCapacity(None)) == 0
+    assert len(ClusterCapacity(CLUSTER_GROUPS)) == 3
@@ -0,0 +1,78 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import load_script
+
+launcher = load_script("launch-nvcf")
+
+
+class FakeDaemon:
+    def __init__(self):
+        self.rollouts = {"abc": {"id": "abc", "state": "succeeded", "functions": ["a"], "skipped": [], "failures": []}}
+
+    def list_rollouts(self):
+        return list(self.rollouts.values())
+
+    def get_rollout(self, rollout_id):
+        return self.rollouts.get(rollout_id)
+
+    def status(self):
+        return {"rollouts": len(self.rollouts)}
+
+    def submit(self, function_name="*", force=False, changed_since=None):
+        rollout = {"id": "new", "state": "queued", "functions": [function_name], "skipped": [], "failures": []}
+        self.rollouts["new"] = rollout
+        return rollout
+
+
+@pytest.fixture
+def daemon_address(monkeypatch):
+    def start(token=None):
+        server = launcher.DaemonServer(FakeDaemon(), ("127.0.0.1", 0), token)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"127.0.0.1:{server.server_address[1]}"
+
+    servers = []
+    monkeypatch.delenv("NVCF_DAEMON_TOKEN", raising=False)
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_token_is_required_when_set(daemon_address, monkeypatch):
+    address = daemon_address(token="s3cret")
+    assert launcher.daemon_request(address, "GET", "/status")[0] == 401
+    assert launcher.daemon_request(address, "POST", "/rollouts", {"function_name": "a"})[0] == 401
+    monkeypatch.setenv("NVCF_DAEMON_TOKEN", "s3cret")
+    assert launcher.daemon_request(address, "GET", "/status") == (200, {"rollouts": 1})
+
+
+def test_unknown_rollout_is_404(daemon_address):
+    address = daemon_address()
+    assert launcher.daemon_request(address, "GET", "/rollouts/abc")[1]["state"] == "succeeded"
+    assert launcher.daemon_request(address, "GET", "/rollouts/nope") == (404, {"detail": "No such rollout"})
+
+
+def test_wait_exits_on_an_error_reply(daemon_address, monkeypatch):
+    address = daemon_address()
+    replies = iter([(202, {"id": "gone", "state": "queued", "functions": ["a"]}), (404, {"detail": "No such rollout"})])
+    monkeypatch.setattr(launcher, "daemon_request", lambda *args, **kwargs: next(replies))
+    args = SimpleNamespace(
+        daemon=address, function_name="a", force=False, changed_since=None, wait=True, wait_interval=0
+    )
+    with pytest.raises(SystemExit) as exit_info:
+        launcher.submit_to_daemon(args)
+    assert exit_info.value.code == 1
+
+
+def test_unreachable_daemon_exits(monkeypatch):
+    args = SimpleNamespace(
+        daemon="127.0.0.1:1", function_name="a", force=False, changed_since=None, wait=False, wait_interval=0
+    )
+    with pytest.raises(SystemExit) as exit_info:
+        launcher.submit_to_daemon(args)
+    assert exit_info.value.code == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from common import CutoverSpec, FunctionRecord, FunctionSpec, Manifest, ManifestError, ProbeSpec
+
+FUNCTION = {
+    "type": "production",
+    "inferenceUrl": "/v1/chat/completions",
+    "inferencePort": "80",
+    "healthUri": "/health",
+    "containerImage": "nvcr.io/org/team/app:1",
+    "apiBodyFormat": "CUSTOM",
+    "inst_backend": "GFN",
+    "inst_gpu_type": "L40S",
+    "inst_type": "gl40s_1.br25_2xlarge",
+    "inst_min": 1,
+    "inst_max": 2,
+}
+
+
+def manifest(**function):
+    return {"name": "app", "functions": [{**FUNCTION, **function}]}
+
+
+def test_converts_and_defaults():
+    fn = Manifest.from_dict(manifest(auto_clean="yes", models=[{"name": "m", "version": 1, "uri": "m"}], ngc_org="org"))
+    fn = fn.functions[0]
+    assert fn.inferencePort == 80
+    assert fn.auto_clean is True and fn.auto_test is False
+    assert fn.models[0].version == "1"
+    assert fn.probe == ProbeSpec() and fn.cutover.mode == "immediate"
+    assert str(fn.placement) == "GFN/L40S/gl40s_1.br25_2xlarge"
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ({"functions": []}, "Manifest.name: required field is missing"),
+        ({"name": "app", "functions": {}}, "Manifest.functions: expected a list, got dict"),
+        ({"name": "app", "functions": ["x"]}, "Manifest.functions[0]: expected a mapping, got str"),
+        (manifest(inst_max=None), "Manifest.functions[0].inst_max: required field is missing"),
+        (manifest(inst_min="one"), "Manifest.functions[0].inst_min:"),
+        (manifest(inst_min=3), "Manifest.functions[0]: inst_min (3) is greater than inst_max (2)"),
+        (manifest(auto_clean="maybe"), "Manifest.functions[0].auto_clean: expected a boolean, got 'maybe'"),
+        (manifest(containerEnvironment=[{"value": "x"}]), "Manifest.functions[0].containerEnvironment[0].key: required"),
+        (manifest(models=[{"name": "m", "version": "1"}]), "Manifest.functions[0].models[0].uri: required"),
+        (manifest(containerImage="app:1"), "ngc_org is required when containerImage is not a full nvcr.io path"),
+        (manifest(probe={"requests": 0}), "Manifest.functions[0].probe: requests and concurrency must be at least 1"),
+        (manifest(probe={"slo_p95_ms": "fast"}), "Manifest.functions[0].probe.slo_p95_ms:"),
+        (manifest(cutover={"mode": "slow"}), "Manifest.functions[0].cutover: mode must be one of"),
+        (manifest(placements=[{"inst_backend": "GFN"}]), "Manifest.functions[0].placements[0].inst_gpu_type: required"),
+        (manifest(keep_newer_than="soon"), "Manifest.functions[0].keep_newer_than: expected a duration like"),
+    ],
+)
+def test_errors_name_the_path(data, message):
+    with pytest.raises(ManifestError) as error:
+        Manifest.from_dict(data)
+    assert message in str(error.value)
+
+
+def test_unknown_keys_are_warned_about(caplog):
+    Manifest.from_dict(manifest(inst_maximum=3))
+    assert "ignoring unknown key(s) ['inst_maximum']" in caplog.text
+
+
+def test_records_ignore_unknown_keys_quietly(caplog):
+    record = FunctionRecord.from_dict({"id": "f", "versionId": "v", "name": "ai-app", "ncaId": "x"})
+    assert record.status is None and record.tags == []
+    assert "ignoring" not in caplog.text
+
+
+def test_image_is_completed_from_the_org():
+    fn = FunctionSpec.from_dict({**FUNCTION, "containerImage": "app:1", "ngc_org": "org", "ngc_team": "team"})
+    assert fn.image == "nvcr.io/org/team/app:1"
+
+
+def test_models_are_slotted():
+    with pytest.raises(AttributeError):
+        CutoverSpec().unknown = 1
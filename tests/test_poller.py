@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from common import DeploymentFailed, DeploymentPoller, DeploymentWatch
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeClient:
+    # Serves a fixed sequence of statuses per URL; "slow" URLs block until released
+    def __init__(self, statuses, slow=()):
+        self.statuses = {url: list(values) for url, values in statuses.items()}
+        self.slow = set(slow)
+        self.release = threading.Event()
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        if url in self.slow:
+            self.release.wait(5)
+        values = self.statuses[url]
+        status = values.pop(0) if len(values) > 1 else values[0]
+        return FakeResponse({"deployment": {"functionStatus": status}})
+
+
+def poller(client, **kwargs):
+    return DeploymentPoller(client, fast_interval=0.01, slow_interval=0.05, fast_window=0.1, **kwargs)
+
+
+def test_reports_active_and_error():
+    client = FakeClient({"a": ["DEPLOYING", "DEPLOYING", "ACTIVE"], "b": ["DEPLOYING", "ERROR"]})
+    p = poller(client)
+    try:
+        active, error = p.watch("a", timeout=5), p.watch("b", timeout=5)
+        assert active.result(5)["deployment"]["functionStatus"] == "ACTIVE"
+        with pytest.raises(DeploymentFailed, match="ERROR"):
+            error.result(5)
+        assert p.requests == 5
+    finally:
+        p.close()
+
+
+def test_times_out():
+    p = poller(FakeClient({"a": ["DEPLOYING"]}))
+    try:
+        with pytest.raises(TimeoutError, match="DEPLOYING"):
+            p.watch("a", timeout=0.1).result(5)
+    finally:
+        p.close()
+
+
+def test_slow_status_call_does_not_hold_up_other_deployments():
+    client = FakeClient({"slow": ["ACTIVE"], "fast": ["DEPLOYING", "ERROR"]}, slow={"slow"})
+    p = poller(client, workers=2)
+    try:
+        slow = p.watch("slow", timeout=10)
+        start = time.monotonic()
+        with pytest.raises(DeploymentFailed):
+            p.watch("fast", timeout=10).result(5)
+        assert time.monotonic() - start < 1
+        assert not slow.done()
+        client.release.set()
+        slow.result(5)
+    finally:
+        p.close()
+
+
+def test_close_cancels_pending_watches():
+    p = poller(FakeClient({"a": ["DEPLOYING"]}))
+    future = p.watch("a", timeout=60)
+    time.sleep(0.05)
+    p.close()
+    time.sleep(0.1)
+    assert future.cancelled()
+
+
+def test_backs_off_again_after_expected_finish():
+    # An hour-long deploy that usually takes 5 minutes: frequent checks
+    # around the 5 minute mark, then back to the slow interval
+    p = DeploymentPoller(FakeClient({}))
+    watch = DeploymentWatch("a", "a", 3600, 300, None, None, None, None)
+    watch.started, watch.deadline = 0.0, 3600.0
+    polls, now = [], 0.0
+    while now < watch.deadline:
+        now += p.next_interval(watch, now)
+        polls.append(now)
+    assert len([t for t in polls if 240 <= t < 360]) == 24
+    assert watch.interval == p.slow_interval
+    assert len(polls) < 120
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+from common import NVCFClient, PreflightChecker
+
+
+@pytest.mark.parametrize(
+    "image, expected",
+    [
+        ("nvcr.io/org/team/app:v2", ("nvcr.io", "org/team/app", "v2")),
+        ("nvcr.io/org/app", ("nvcr.io", "org/app", "latest")),
+        ("nvcr.io/org/app@sha256:abc", ("nvcr.io", "org/app", "sha256:abc")),
+        ("localhost:5000/app:1", ("localhost:5000", "app", "1")),
+        ("ubuntu:22.04", ("docker.io", "ubuntu", "22.04")),
+        ("library/ubuntu", ("docker.io", "library/ubuntu", "latest")),
+    ],
+)
+def test_split_image(image, expected):
+    assert PreflightChecker.split_image(image) == expected
+
+
+def function(image, models=()):
+    return SimpleNamespace(
+        image=image,
+        ngc_org="org",
+        ngc_team="team",
+        models=[SimpleNamespace(uri=uri, version=version) for uri, version in models],
+    )
+
+
+@pytest.fixture
+def checker(mock_api):
+    def make(**options):
+        server = mock_api(**options)
+        reauthenticated = []
+        client = NVCFClient(lambda: "key", on_unauthorized=lambda: reauthenticated.append(1), max_retries=0)
+        checker = PreflightChecker(client, f"{server.url}/v2", f"{server.url}/v2", lambda: "key")
+        checker.mock = server.mock
+        checker.reauthenticated = reauthenticated
+        return checker
+    return make
+
+
+def test_missing_image_and_model_are_reported(checker):
+    check = checker(missing_images={"org/team/app:v2"}, missing_models={"llama:1.0"})
+    try:
+        problems = check.problems(function("nvcr.io/org/team/app:v2", [("llama", "1.0"), ("embed", "2")]))
+        assert problems == [
+            "image nvcr.io/org/team/app:v2 not found in nvcr.io",
+            "model llama version 1.0 not found in org/org/team/team",
+        ]
+        assert check.problems(function("nvcr.io/org/team/app:v1")) == []
+    finally:
+        check.shutdown()
+
+
+def test_registry_challenge_is_answered_without_nvcf_reauth(checker):
+    check = checker()
+    try:
+        assert check.problems(function("nvcr.io/org/team/app:v1")) == []
+        # One challenge, one token, one authenticated HEAD; the NVCF key is not reloaded
+        assert check.mock.requests["registry_challenge"] == 1
+        assert check.mock.requests["registry_token"] == 1
+        assert check.mock.requests["image_manifest"] == 2
+        assert not check.reauthenticated
+    finally:
+        check.shutdown()
+
+
+def test_each_image_is_checked_once(checker):
+    check = checker()
+    try:
+        for _ in range(3):
+            check.problems(function("nvcr.io/org/team/app:v1"))
+        assert check.mock.requests["registry_token"] == 1
+    finally:
+        check.shutdown()
+
+
+def test_images_outside_nvcr_are_not_checked(checker):
+    check = checker()
+    try:
+        assert check.problems(function("ubuntu:22.04")) == []
+        assert check.mock.requests["total"] == 0
+    finally:
+        check.shutdown()
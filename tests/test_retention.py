@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from common import Manifest, load_yaml, parse_duration
+from conftest import ROOT, load_script
+
+launcher = load_script("launch-nvcf")
+
+
+def runner(**kwargs):
+    return launcher.NVCFRunner(job_name="Test", env_vars={}, backend="test", **kwargs)
+
+
+def iso(delta, aware=True):
+    value = datetime.now(timezone.utc) - delta
+    return value.isoformat() if aware else value.replace(tzinfo=None).isoformat()
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-05-01T10:00:00Z", datetime(2024, 5, 1, 10, tzinfo=timezone.utc)),
+        ("2024-05-01T10:00:00.123456Z", datetime(2024, 5, 1, 10, 0, 0, 123456, tzinfo=timezone.utc)),
+        ("2024-05-01T12:00:00+02:00", datetime(2024, 5, 1, 10, tzinfo=timezone.utc)),
+        ("2024-05-01T10:00:00", datetime(2024, 5, 1, 10, tzinfo=timezone.utc)),
+        ("not a time", None),
+        (None, None),
+    ],
+)
+def test_parse_timestamp(value, expected):
+    assert launcher.parse_timestamp(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("90s", timedelta(seconds=90)), ("30m", timedelta(minutes=30)), ("12h", timedelta(hours=12)),
+     ("7d", timedelta(days=7)), ("2w", timedelta(weeks=2)), ("45", timedelta(seconds=45))],
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+def test_parse_duration_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def old_versions(run, created):
+    run.inventory.load([
+        {"id": "fn", "versionId": version_id, "name": "ai-app", "status": "INACTIVE", "createdAt": created_at}
+        for version_id, created_at in created.items()
+    ])
+    return SimpleNamespace(
+        name="app", current_id="fn", old_versions=list(created), keep_versions=None, keep_newer_than=None
+    )
+
+
+def test_versions_to_clean_mixes_naive_and_aware_timestamps():
+    run = runner(keep_versions=1, keep_newer_than=timedelta(days=1))
+    fn = old_versions(run, {
+        "newest": iso(timedelta(hours=1), aware=False),
+        "recent": iso(timedelta(hours=2)),
+        "old": iso(timedelta(days=3), aware=False),
+        "older": iso(timedelta(days=4)),
+        "unknown": None,
+    })
+    assert [r.versionId for r in run._versions_to_clean(fn)] == ["old", "older", "unknown"]
+
+
+def test_function_overrides_the_cli_retention():
+    run = runner(keep_versions=3)
+    fn = old_versions(run, {f"v{i}": iso(timedelta(days=i)) for i in range(4)})
+    fn.keep_versions = 1
+    fn.keep_newer_than = "2d"
+    assert [r.versionId for r in run._versions_to_clean(fn)] == ["v2", "v3"]
+
+
+def test_retention_keys_reach_the_manifest():
+    run = runner()
+    context = {
+        "fn_name": "app", "fn_image": "nvcr.io/org/app:1", "fn_ngc_org": "org", "fn_ngc_team": "team",
+        "fn_hugging_face_hub_token": "hf", "containerArgs": "", "env": [], "models": [],
+        "inst_backend": "GFN", "inst_gpu_type": "L40S", "inst_type": "gl40s", "inst_min": 1, "inst_max": 1,
+        "inst_max_request_concurrency": 1, "keep_versions": 2, "keep_newer_than": "3d",
+    }
+    rendered = run.render_template("launch-template.yml.j2", context, f"{ROOT}/templates")
+    fn = Manifest.from_dict(load_yaml(rendered)).functions[0]
+    assert (fn.keep_versions, fn.keep_newer_than) == (2, "3d")
+
+    del context["keep_versions"], context["keep_newer_than"]
+    fn = Manifest.from_dict(load_yaml(run.render_template("launch-template.yml.j2", context, f"{ROOT}/templates")))
+    assert (fn.functions[0].keep_versions, fn.functions[0].keep_newer_than) == (None, None)
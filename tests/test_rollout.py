@@ -0,0 +1,222 @@
+import functools
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from common import DeploymentHistory, DeploymentPoller, dump_yaml
+from conftest import ROOT, load_script
+
+launcher = load_script("launch-nvcf")
+
+PLACEMENT = {"inst_backend": "GFN", "inst_gpu_type": "L40S", "inst_type": "gl40s_1.br25_2xlarge"}
+
+
+def function(name, **fields):
+    entry = {
+        "fn_name": name,
+        "containerArgs": "--model-id test/model",
+        "env": [],
+        "models": [],
+        **PLACEMENT,
+        "inst_min": 1,
+        "inst_max": 1,
+        "inst_max_request_concurrency": 1,
+    }
+    entry.update(fields)
+    return entry
+
+
+@pytest.fixture
+def rollout(tmp_path, monkeypatch, mock_api):
+    # Runs launch-nvcf.py main() in tmp_path against a mock NVCF API and
+    # returns its exit code
+    server = mock_api()
+    os.makedirs(tmp_path / "templates")
+    shutil.copy(os.path.join(ROOT, "templates", "launch-template.yml.j2"), tmp_path / "templates")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("NVCF_API_BASE", server.url)
+    monkeypatch.setenv("PRD_NVCF_API_KEY", "test-key")
+    monkeypatch.setenv("FN_NGC_ORG", "test-org")
+    monkeypatch.setenv("FN_NGC_TEAM", "test-team")
+    monkeypatch.setenv("FN_HUGGING_FACE_HUB_TOKEN", "hf_test")
+    # Check the mock deployments often instead of every 5s
+    monkeypatch.setattr(launcher, "DeploymentPoller", functools.partial(DeploymentPoller, fast_interval=0.1))
+
+    def run(functions, *args, image="nvcr.io/test-org/test-team/app:v1"):
+        with open("launch-list.yml", "w") as file:
+            dump_yaml({"fn_image": image, "functions": functions}, file, sort_keys=False)
+        monkeypatch.setattr(sys, "argv", [
+            "launch-nvcf.py",
+            "--manifest", "templates/launch-template.yml.j2",
+            "--environment", "production",
+            "--function-name", "*",
+            "--max-parallel", "4",
+            "--journal", str(tmp_path / "journal.jsonl"),
+            "--history", "",
+            *args,
+        ])
+        try:
+            launcher.main()
+        except SystemExit as exit:
+            return exit.code
+        return 0
+
+    run.mock = server.mock
+    return run
+
+
+def versions(mock, name):
+    return [record for record in mock.functions.values() if record["name"] == name]
+
+
+def test_skips_unchanged_function(rollout):
+    mock = rollout.mock
+    assert rollout([function("app")]) == 0
+    assert mock.requests["register_function"] == 1
+    assert [record["status"] for record in versions(mock, "ai-app")] == ["ACTIVE"]
+
+    assert rollout([function("app")]) == 0
+    assert mock.requests["register_function"] == 1
+    assert mock.requests["register_version"] == 0
+    assert mock.requests["deploy"] == 1
+
+    # A changed spec is deployed as a new version
+    assert rollout([function("app", inst_max=2)]) == 0
+    assert mock.requests["register_version"] == 1
+
+
+def test_resumes_timed_out_deployment(rollout):
+    mock = rollout.mock
+    mock.deploy_duration = (1.5, 1.5)
+    assert rollout([function("app")], "--deploy-timeout", "0.3") == 1
+    assert [record["status"] for record in versions(mock, "ai-app")] == ["DEPLOYING"]
+
+    # The second run reattaches to the journaled version instead of registering another
+    assert rollout([function("app")]) == 0
+    assert mock.requests["register_function"] == 1
+    assert mock.requests["deploy"] == 1
+    assert [record["status"] for record in versions(mock, "ai-app")] == ["ACTIVE"]
+
+    assert rollout([function("app", inst_max=2)], "--deploy-timeout", "0.3", "--no-resume") == 1
+    assert mock.requests["register_version"] == 1
+
+
+def test_resumed_deployment_is_timed_from_registration(rollout, tmp_path):
+    mock = rollout.mock
+    mock.deploy_duration = (1.5, 1.5)
+    history = str(tmp_path / "history.jsonl")
+    assert rollout([function("app")], "--deploy-timeout", "0.3", "--history", history) == 1
+    assert rollout([function("app")], "--history", history) == 0
+
+    entries = [json.loads(line) for line in open(history)]
+    assert [entry["outcome"] for entry in entries] == ["TIMEOUT", "ACTIVE"]
+    assert entries[0]["duration"] >= 0.3
+    assert entries[1]["duration"] >= 1.5
+    assert DeploymentHistory(history).durations(function="app") == sorted(e["duration"] for e in entries)
+
+
+def test_preflight_404_skips_function(rollout):
+    mock = rollout.mock
+    mock.missing_images = {"test-org/test-team/app:missing"}
+    missing = function("broken", fn_image="nvcr.io/test-org/test-team/app:missing")
+    assert rollout([missing, function("app")]) == 1
+    assert versions(mock, "ai-broken") == []
+    assert [record["status"] for record in versions(mock, "ai-app")] == ["ACTIVE"]
+    assert mock.requests["image_manifest"] >= 2
+
+
+def test_placement_fallback(rollout):
+    mock = rollout.mock
+    unavailable = {"inst_gpu_type": "A100", "inst_type": "ga100_1.br20_2xlarge"}
+    assert rollout([function("app", **unavailable, placements=[PLACEMENT])]) == 0
+    (record,) = versions(mock, "ai-app")
+    (spec,) = mock.deployments[record["versionId"]]["spec"]["deploymentSpecifications"]
+    assert (spec["gpu"], spec["instanceType"]) == ("L40S", "gl40s_1.br25_2xlarge")
+
+    # Without a fallback nothing is registered
+    assert rollout([function("other", **unavailable)]) == 1
+    assert versions(mock, "ai-other") == []
+
+
+def test_probe_slo_failure_withdraws_new_version(rollout):
+    mock = rollout.mock
+    mock.seed_org(1, 1, prefix="ai-app", spec={})
+    (old,) = versions(mock, "ai-app-0")
+    probe = {"requests": 4, "concurrency": 2, "slo_p95_ms": 1}
+    assert rollout([function("app-0", auto_test="yes", probe=probe)]) == 1
+
+    statuses = {record["versionId"]: record["status"] for record in versions(mock, "ai-app-0")}
+    assert len(statuses) == 2
+    assert statuses.pop(old["versionId"]) == "ACTIVE"
+    assert list(statuses.values()) == ["INACTIVE"]
+    assert mock.requests["undeploy"] == 1
+    assert mock.requests["delete_version"] == 0
+
+
+def test_gradual_cutover_retires_old_versions(rollout):
+    mock = rollout.mock
+    mock.cold_start = 0.3
+    mock.seed_org(1, 2, prefix="ai-app", spec={})
+    cutover = {"mode": "gradual", "warmup_requests": 4, "ready_timeout": 30, "retire_interval": 0.2}
+    assert rollout([function("app-0", cutover=cutover)]) == 0
+
+    (record,) = versions(mock, "ai-app-0")
+    assert record["status"] == "ACTIVE"
+    assert mock.requests["delete_version"] == 2
+    # Not retired until the new version got past its cold start
+    assert mock.requests["cold_invoke"] >= 1
+    assert mock.requests["invoke"] >= 5
+
+
+def test_failed_create_probe_is_probed_again(rollout):
+    mock = rollout.mock
+    probe = {"requests": 4, "concurrency": 2, "slo_p95_ms": 1}
+    assert rollout([function("app", auto_test="yes", probe=probe)]) == 1
+    assert [record["status"] for record in versions(mock, "ai-app")] == ["INACTIVE"]
+    assert mock.requests["undeploy"] == 1
+
+    # Not skipped as unchanged: the rerun deploys a new version and probes it
+    invokes = mock.requests["invoke"]
+    assert rollout([function("app", auto_test="yes", probe=probe)]) == 1
+    assert mock.requests["register_version"] == 1
+    assert mock.requests["invoke"] > invokes
+
+
+def test_failed_withdraw_is_not_skipped_as_unchanged(rollout, monkeypatch):
+    mock = rollout.mock
+    probe = {"requests": 4, "concurrency": 2, "slo_p95_ms": 1}
+
+    def withdraw(self, fn, version_id, reason):
+        raise RuntimeError("undeploy failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(launcher.NVCFRunner, "_withdraw", withdraw)
+        assert rollout([function("app", auto_test="yes", probe=probe)]) == 1
+    # Still ACTIVE with its spec tag, but journaled as failed
+    assert [record["status"] for record in versions(mock, "ai-app")] == ["ACTIVE"]
+
+    invokes = mock.requests["invoke"]
+    assert rollout([function("app", auto_test="yes", probe=probe)]) == 1
+    assert mock.requests["register_version"] == 1
+    assert mock.requests["invoke"] > invokes
+
+
+def test_changed_since_is_never_a_git_option(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run([*git, "init", "-q"], check=True)
+    (tmp_path / "launch-list.yml").write_text("functions: []\n")
+    subprocess.run([*git, "add", "launch-list.yml"], check=True)
+    subprocess.run([*git, "commit", "-q", "-m", "init"], check=True)
+
+    commit = launcher.resolve_commit("HEAD")
+    assert len(commit) == 40
+    assert launcher.git_show(commit, "launch-list.yml") == "functions: []\n"
+    for rev in ("--output=out.txt", "-p", "HEAD --output=out.txt", "missing", ""):
+        assert launcher.resolve_commit(rev) is None
+        assert launcher.changed_functions(None, rev, {}, [], ".", "template.j2", {}) is None
+    assert not (tmp_path / "out.txt").exists()
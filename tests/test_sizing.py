@@ -0,0 +1,54 @@
+import threading
+
+from conftest import load_script
+
+sizing = load_script("size-nvcf")
+
+
+def test_recommend_without_queueing():
+    result = sizing.recommend(1, 2, 4, [0, 0, 0], [0.1, 0.1, 0.1])
+    assert (result["inst_min"], result["inst_max"], result["inst_max_request_concurrency"]) == (1, 2, 4)
+    assert result["reason"] == "no queueing and latency within target"
+
+
+def test_recommend_scales_out_for_queue():
+    # 2 x 1 slots plus 4 queued at p95, with 1.5x headroom
+    result = sizing.recommend(1, 2, 1, [4] * 10, [], headroom=1.5)
+    assert (result["inst_min"], result["inst_max"], result["inst_max_request_concurrency"]) == (1, 9, 1)
+
+
+def test_recommend_concurrency_follows_latency_target():
+    slow = sizing.recommend(1, 2, 4, [], [2.0] * 10, target_latency_ms=1000)
+    assert (slow["inst_max"], slow["inst_max_request_concurrency"]) == (4, 2)
+    assert "over the 1000ms target" in slow["reason"]
+    # At most doubles per run
+    fast = sizing.recommend(1, 4, 2, [], [0.1] * 10, target_latency_ms=1000)
+    assert (fast["inst_max"], fast["inst_max_request_concurrency"]) == (2, 4)
+
+
+def test_advise_samples_parallel_functions_at_a_time(mock_api, monkeypatch):
+    server = mock_api()
+    server.mock.seed_org(5, 1, prefix="ai-app", spec={})
+    monkeypatch.setenv("NVCF_API_BASE", server.url)
+    monkeypatch.setenv("PRD_NVCF_API_KEY", "test-key")
+    advisor = sizing.SizingAdvisor(job_name="Test", window=0.2, interval=0.1, latency_samples=False, parallel=2)
+
+    running, peak = 0, 0
+    lock = threading.Lock()
+    sample = advisor.sample
+
+    def tracked(fn_name):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        try:
+            return sample(fn_name)
+        finally:
+            with lock:
+                running -= 1
+
+    advisor.sample = tracked
+    advice = advisor.advise([{"fn_name": f"app-{i}"} for i in range(5)])
+    assert peak == 2
+    assert [item["fn_name"] for item in advice] == [f"app-{i}" for i in range(5)]
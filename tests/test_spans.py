@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from common import SpanRecorder, log_context
+
+
+def test_summary_and_per_function_totals_survive_keep_last():
+    spans = SpanRecorder()
+    spans.keep_last(2)
+    log_context.name = "fn-a"
+    try:
+        for duration in (1.0, 2.0, 3.0):
+            spans.record("poll", 0.0, duration, retries=1)
+        spans.record("poll", 0.0, 0.5, error="HTTPError")
+    finally:
+        log_context.name = None
+
+    assert len(spans.spans) == 2
+    poll = spans.summary()["poll"]
+    assert poll["count"] == 4
+    assert poll["total"] == pytest.approx(6.5)
+    assert poll["max"] == 3.0
+    assert poll["retries"] == 3
+    assert poll["errors"] == 1
+    assert 'nvcf_launcher_function_phase_seconds{function="fn-a",phase="poll"} 6.500000' in spans.prometheus_text()
+
+
+def test_span_records_errors_and_attributes():
+    spans = SpanRecorder()
+    with spans.span("register", method="POST") as attrs:
+        attrs["status"] = 200
+    with pytest.raises(ValueError):
+        with spans.span("deploy"):
+            raise ValueError("boom")
+    register, deploy = spans.spans
+    assert register["method"] == "POST" and register["status"] == 200
+    assert deploy["error"] == "ValueError: boom"
+
+
+def test_write_json(tmp_path):
+    spans = SpanRecorder()
+    spans.record("render", 0.0, 0.25)
+    path = tmp_path / "report" / "spans.json"
+    spans.write_json(str(path))
+    report = json.loads(path.read_text())
+    assert report["phases"]["render"]["count"] == 1
+    assert [span["phase"] for span in report["spans"]] == ["render"]
+
+
+def test_prometheus_text_escapes_labels_and_types_counters():
+    spans = SpanRecorder()
+    log_context.name = 'fn "a"\\b\nc'
+    try:
+        spans.record("poll", 0.0, 1.0)
+    finally:
+        log_context.name = None
+    text = spans.prometheus_text()
+    assert 'nvcf_launcher_function_phase_seconds{function="fn \\"a\\"\\\\b\\nc",phase="poll"} 1.000000' in text
+    assert "# TYPE nvcf_launcher_phase_seconds_total counter" in text
+    assert "# TYPE nvcf_launcher_phase_errors_total counter" in text
+    assert "# TYPE nvcf_launcher_phase_seconds_max gauge" in text
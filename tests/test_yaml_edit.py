@@ -0,0 +1,86 @@
+import pytest
+import yaml
+
+from yaml_edit import update_yaml, update_yaml_file
+
+LAUNCH_LIST = """\
+# Functions deployed by launch-nvcf.py
+fn_ngc_org: myorg
+functions:
+  - fn_name: "llama"  # chat model
+    fn_image: 'nvcr.io/myorg/llama:1.0'
+    inst_max: 2
+  - fn_name: embed
+    fn_image: nvcr.io/myorg/embed:1.0
+    probe:
+      requests: 50
+"""
+
+
+def test_replaces_one_value_and_keeps_the_rest():
+    updated = update_yaml(LAUNCH_LIST, {("functions", 1, "fn_image"): "nvcr.io/myorg/embed:2.0"})
+    assert updated == LAUNCH_LIST.replace("embed:1.0", "embed:2.0")
+
+
+def test_keeps_quote_style_and_comments():
+    updated = update_yaml(LAUNCH_LIST, {
+        ("functions", 0, "fn_name"): "llama-3",
+        ("functions", 0, "fn_image"): "nvcr.io/myorg/llama:1.1",
+    })
+    assert '  - fn_name: "llama-3"  # chat model\n' in updated
+    assert "    fn_image: 'nvcr.io/myorg/llama:1.1'\n" in updated
+    assert updated.startswith("# Functions deployed by launch-nvcf.py\n")
+
+
+def test_non_string_values_are_written_as_yaml_scalars():
+    updated = update_yaml(LAUNCH_LIST, {("functions", 0, "inst_max"): 4, ("functions", 1, "probe", "requests"): 100})
+    data = yaml.safe_load(updated)
+    assert data["functions"][0]["inst_max"] == 4
+    assert data["functions"][1]["probe"]["requests"] == 100
+
+
+def test_appends_a_missing_key_at_the_mapping_indent():
+    updated = update_yaml(LAUNCH_LIST, {("functions", 0, "inst_min"): 1})
+    assert "    inst_max: 2\n    inst_min: 1\n  - fn_name: embed\n" in updated
+    assert yaml.safe_load(updated)["functions"][0]["inst_min"] == 1
+
+
+def test_appends_after_a_nested_block():
+    updated = update_yaml(LAUNCH_LIST, {("functions", 1, "inst_max"): 3})
+    assert updated.endswith("    probe:\n      requests: 50\n    inst_max: 3\n")
+
+
+def test_appends_to_a_file_without_a_trailing_newline():
+    updated = update_yaml("a: 1", {("b",): 2})
+    assert updated == "a: 1\nb: 2\n"
+
+
+def test_missing_path_raises():
+    with pytest.raises(KeyError):
+        update_yaml(LAUNCH_LIST, {("missing", "fn_image"): "x"})
+    with pytest.raises(IndexError):
+        update_yaml(LAUNCH_LIST, {("functions", 5, "fn_image"): "x"})
+
+
+def test_cannot_replace_a_collection():
+    with pytest.raises(ValueError):
+        update_yaml(LAUNCH_LIST, {("functions", 1, "probe"): 1})
+
+
+def test_cannot_append_to_a_flow_mapping():
+    with pytest.raises(ValueError):
+        update_yaml("probe: {requests: 50}\n", {("probe", "concurrency"): 4})
+
+
+def test_empty_document_raises():
+    with pytest.raises(ValueError):
+        update_yaml("", {("a",): 1})
+
+
+def test_update_yaml_file_only_writes_on_change(tmp_yaml):
+    path = tmp_yaml(LAUNCH_LIST)
+    mtime = path.stat().st_mtime_ns
+    assert not update_yaml_file(path, {("fn_ngc_org",): "myorg"})
+    assert path.stat().st_mtime_ns == mtime
+    assert update_yaml_file(path, {("fn_ngc_org",): "other"})
+    assert "fn_ngc_org: other\n" in path.read_text()
@@ -1,14 +1,16 @@
-import yaml
 import sys
 import os
 
+from common import load_yaml
+from yaml_edit import update_yaml_file
+
 def update_launch_list(new_tag):
     if not os.path.exists('launch-list.yml'):
         print("Error: launch-list.yml not found")
         sys.exit(1)
 
     with open('launch-list.yml', 'r') as file:
-        data = yaml.safe_load(file)
+        data = load_yaml(file)
     
     if 'fn_image' not in data:
         print("Error: fn_image field not found in launch-list.yml")
@@ -20,10 +22,8 @@ def update_launch_list(new_tag):
         print("Error: Invalid fn_image format")
         sys.exit(1)
 
-    data['fn_image'] = f"{image_parts[0]}:{new_tag}"
-    
-    with open('launch-list.yml', 'w') as file:
-        yaml.dump(data, file)
+    # Only the tag changes on disk; comments and key order are kept
+    update_yaml_file('launch-list.yml', {('fn_image',): f"{image_parts[0]}:{new_tag}"})
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
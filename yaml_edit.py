@@ -0,0 +1,76 @@
+import yaml
+
+
+def _scalar(value, style=None):
+    # Render value as a single YAML scalar, keeping the quote style it replaces
+    if style not in ('"', "'") or not isinstance(value, str):
+        style = None
+    text = yaml.safe_dump(value, default_style=style, width=float("inf"), allow_unicode=True)
+    if text.endswith("\n...\n"):
+        text = text[: -len("\n...\n")]
+    return text.strip()
+
+
+def _child(node, key):
+    if isinstance(node, yaml.SequenceNode):
+        return node.value[int(key)]
+    if isinstance(node, yaml.MappingNode):
+        for key_node, value_node in node.value:
+            if key_node.value == str(key):
+                return value_node
+        return None
+    raise ValueError(f"cannot look up {key!r} in a scalar")
+
+
+def update_yaml(text, updates):
+    # Edits scalar values in YAML text in place, so comments, key order,
+    # indentation and quoting everywhere else stay as they are. updates maps a
+    # key path (tuple of mapping keys and sequence indexes) to the new value;
+    # a missing last key is appended to its (block) mapping
+    root = yaml.compose(text)
+    if root is None:
+        raise ValueError("empty YAML document")
+    edits = []
+    for path, value in updates.items():
+        node = root
+        for key in path[:-1]:
+            node = _child(node, key)
+            if node is None:
+                raise KeyError(f"{'.'.join(map(str, path))}: {key!r} not found")
+        target = _child(node, path[-1])
+        if target is not None:
+            if not isinstance(target, yaml.ScalarNode):
+                raise ValueError(f"{'.'.join(map(str, path))} is not a scalar")
+            edits.append((target.start_mark.index, target.end_mark.index, _scalar(value, target.style)))
+            continue
+
+        if not isinstance(node, yaml.MappingNode) or node.flow_style or not node.value:
+            raise ValueError(f"cannot add {'.'.join(map(str, path))} to this mapping")
+        # Insert after the mapping's last value, at the indentation of its keys
+        # (a nested block collection ends where the next token starts)
+        end = node.value[-1][1].end_mark.index
+        line_start = text.rfind("\n", 0, end) + 1
+        if text[line_start:end].strip():
+            newline = text.find("\n", end)
+            end = len(text) if newline == -1 else newline + 1
+        else:
+            end = line_start
+        indent = " " * node.value[0][0].start_mark.column
+        line = f"{indent}{path[-1]}: {_scalar(value)}\n"
+        if end == len(text) and text and not text.endswith("\n"):
+            line = "\n" + line
+        edits.append((end, end, line))
+
+    for start, end, replacement in sorted(edits, reverse=True):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def update_yaml_file(path, updates):
+    with open(path) as file:
+        text = file.read()
+    updated = update_yaml(text, updates)
+    if updated != text:
+        with open(path, "w") as file:
+            file.write(updated)
+    return updated != text